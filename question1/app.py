@@ -1,70 +1,215 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
 import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 import httpx
 import paramiko
 
+# The probes and result store shared with the other apps live in rakort/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from rakort.netprobe import ResultStore, Subscriber, get_probe  # noqa: E402
+
 app = FastAPI()
 
-# List to store unreachable IP addresses
-unreachable_ips = []
+# Latest probe result per IP address
+results = ResultStore()
+
+# Clients connected to the /events/ stream, mapped to their transitions-only flag
+subscribers = {}
 
 # Network prefix for scanning
 network_prefix = "172.29."
 
+# Maximum number of hosts probed at the same time (tunable per deployment)
+scan_concurrency = int(os.environ.get("SCAN_CONCURRENCY", "256"))
+
+# Reachability probe used by scans: "http", "tcp" or "icmp"
+probe_backend = os.environ.get("PROBE_BACKEND", "http")
+
+# Maximum number of SSH handshakes in flight; each one occupies a worker thread
+ssh_concurrency = int(os.environ.get("SSH_CONCURRENCY", "32"))
+
+# Per-host limit for each SSH phase (TCP connect, banner and auth)
+ssh_timeout = float(os.environ.get("SSH_TIMEOUT", "2.0"))
+
+# Dedicated thread pool so blocking paramiko calls never run on the event loop
+ssh_executor = ThreadPoolExecutor(max_workers=ssh_concurrency,
+                                  thread_name_prefix="ssh-probe")
+ssh_semaphore = asyncio.Semaphore(ssh_concurrency)
+
+# Counters for SSH probe outcomes and the time spent in them
+ssh_stats = {"attempted": 0, "connected": 0,
+             "failed": 0, "timed_out": 0, "total_seconds": 0.0}
+
 # Global variable to control the running state of the scanning operation
 running = True
 
 
-async def check_ip(ip: str):
+def publish(event: dict):
+    """Sends a scan event to every connected stream client."""
+    for subscriber, transitions_only in subscribers.items():
+        if event["changed"] or not transitions_only:
+            subscriber.put(event)
+
+
+def iter_hosts(prefix: str = network_prefix):
+    """Lazily yields every host address under the network prefix.
+
+    Addresses are generated on demand, so memory use does not depend on the
+    size of the scanned range.
+
+    Args:
+        prefix (str): The first two octets of the network, e.g. "172.29.".
+
+    Yields:
+        str: The next IP address to scan.
+    """
+    for i in range(0, 256):  # Scan from 172.29.0.0 to 172.29.255.255
+        for j in range(1, 255):  # Start from 1 to 254 for hosts
+            yield f"{prefix}{i}.{j}"
+
+
+async def check_ip(ip: str, probe):
     """Checks if the specified IP address is reachable and attempts to establish an SSH connection.
 
     Args:
         ip (str): The IP address to check.
+        probe (callable): The reachability probe returned by ``get_probe``.
     """
-    async with httpx.AsyncClient() as client:
-        try:
-            # Ping the IP address using HTTP request
-            response = await client.get(f"http://{ip}", timeout=2.0)
-            if response.status_code == 200:
-                print(f"{ip} is reachable.")
-                # Attempt SSH connection
-                await ssh_connect(ip)
-            else:
-                print(
-                    f"{ip} is unreachable (HTTP status code: {response.status_code}).")
-                unreachable_ips.append(ip)
-        except (httpx.RequestError, httpx.HTTPStatusError) as e:
-            print(f"{ip} is unreachable: {e}")
-            unreachable_ips.append(ip)
-
-
-async def ssh_connect(ip: str):
-    """Attempts to establish an SSH connection to the specified IP address.
+    reachable, reason = await probe(ip)
+    if reachable:
+        print(f"{ip} is reachable.")
+        # Attempt SSH connection; hosts that refuse SSH count as unreachable
+        reachable = await ssh_connect(ip)
+    else:
+        print(f"{ip} is unreachable: {reason}")
+    previous = results.record(ip, reachable)
+    if subscribers:
+        publish({"ip": ip, "previous": previous, "reachable": reachable,
+                 "changed": previous != reachable, "reason": reason,
+                 "timestamp": time.time()})
+
+
+def _is_timeout(error: BaseException):
+    """Returns True if a paramiko error was caused by one of its time limits."""
+    while error is not None:
+        # paramiko reports banner and auth timeouts as generic SSH errors
+        if isinstance(error, TimeoutError) or "timeout" in str(error).lower():
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _ssh_connect_blocking(ip: str, timeout: float):
+    """Opens and closes an SSH connection; runs on the SSH executor.
+
+    paramiko's time limits start when a worker thread picks the job up, so
+    time spent waiting for a free thread never counts against the host.
 
     Args:
         ip (str): The IP address to connect to.
+        timeout (float): The limit applied to each paramiko connection phase.
+
+    Raises:
+        TimeoutError: If one of the connection phases ran out of time.
     """
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     try:
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         # Attempt to connect to the IP (replace 'username' and 'password' as needed)
-        client.connect(ip, username='username', password='password', timeout=2)
-        print(f"SSH connection established to {ip}.")
+        client.connect(ip, username='username', password='password',
+                       timeout=timeout, banner_timeout=timeout,
+                       auth_timeout=timeout)
+    except Exception as e:
+        if _is_timeout(e):
+            raise TimeoutError(str(e) or "timed out") from e
+        raise
+    finally:
         client.close()
+
+
+def _release_ssh_slot(loop: asyncio.AbstractEventLoop):
+    """Frees an SSH slot from the executor thread once its job has finished."""
+    try:
+        loop.call_soon_threadsafe(ssh_semaphore.release)
+    except RuntimeError:
+        pass  # The event loop is already closed
+
+
+async def ssh_connect(ip: str, timeout: float = ssh_timeout):
+    """Attempts to establish an SSH connection to the specified IP address.
+
+    The handshake runs on a bounded thread pool, so a slow host never blocks
+    the event loop. A slot is only handed back when the worker thread is
+    really free, so queued hosts never wait behind a handshake that has
+    already been given up on. The time limits are paramiko's own, applied to
+    each phase of the attempt.
+
+    Args:
+        ip (str): The IP address to connect to.
+        timeout (float): The time budget for each SSH connection phase.
+
+    Returns:
+        bool: True if the SSH connection succeeded.
+    """
+    await ssh_semaphore.acquire()
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    ssh_stats["attempted"] += 1
+    try:
+        future = ssh_executor.submit(_ssh_connect_blocking, ip, timeout)
+    except RuntimeError:
+        ssh_semaphore.release()  # The executor has been shut down
+        raise
+    future.add_done_callback(lambda _: _release_ssh_slot(loop))
+    try:
+        await asyncio.wrap_future(future)
+        ssh_stats["connected"] += 1
+        print(f"SSH connection established to {ip}.")
+        return True
+    except TimeoutError:
+        ssh_stats["timed_out"] += 1
+        print(f"SSH connection to {ip} timed out after {timeout} seconds.")
     except Exception as e:
+        ssh_stats["failed"] += 1
         print(f"Error connecting to {ip} via SSH: {e}")
-        unreachable_ips.append(ip)
+    finally:
+        ssh_stats["total_seconds"] += time.monotonic() - started
+    return False
 
 
-async def scan_network():
-    """Scan the specified network for active IP addresses."""
-    tasks = []
-    for i in range(0, 256):  # Scan from 172.29.0.0 to 172.29.255.255
-        for j in range(1, 255):  # Start from 1 to 254 for hosts
-            ip = f"{network_prefix}{i}.{j}"
-            tasks.append(check_ip(ip))
+async def scan_network(concurrency: int = scan_concurrency, backend: str = probe_backend):
+    """Scan the specified network for active IP addresses.
 
-    await asyncio.gather(*tasks)  # Run all tasks concurrently
+    A fixed number of workers pull addresses from a shared lazy generator, so
+    at most ``concurrency`` probes are in flight at any time. All workers share
+    a single pooled HTTP client.
+
+    Args:
+        concurrency (int): The maximum number of hosts probed at the same time.
+        backend (str): The reachability probe to use: "http", "tcp" or "icmp".
+    """
+    hosts = iter_hosts()
+    # Every host is probed once, so idle keep-alive sockets would only hold
+    # file descriptors; the pool just caps the number of open connections
+    limits = httpx.Limits(max_connections=concurrency,
+                          max_keepalive_connections=0)
+
+    async with httpx.AsyncClient(limits=limits) as client:
+        probe = get_probe(backend, client)
+
+        async def worker():
+            # Each worker takes the next address as soon as its slot frees up
+            for ip in hosts:
+                if not running:
+                    return
+                await check_ip(ip, probe)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
 
 
 @app.on_event("startup")
@@ -78,16 +223,71 @@ async def shutdown_event():
     """Handles the application shutdown event."""
     global running
     running = False  # Stop the scanning loop
+    # Drop queued SSH probes; running ones finish within their own timeout
+    ssh_executor.shutdown(wait=False, cancel_futures=True)
 
 
 @app.get("/unreachable/")
-async def get_unreachable_ips():
-    """Retrieves the list of unreachable IP addresses.
+async def get_unreachable_ips(after: str = None, limit: int = Query(100, ge=1, le=1000)):
+    """Retrieves a page of unreachable IP addresses.
+
+    Args:
+        after (str): Return addresses after this one; use the "next" value of the previous page.
+        limit (int): The maximum number of addresses to return.
 
     Returns:
-        dict: A dictionary containing the list of unreachable IP addresses.
+        dict: A dictionary containing the page of unreachable IP addresses and the next cursor.
     """
-    return {"unreachable_ips": unreachable_ips}
+    try:
+        ips, cursor = results.page_ips(reachable=False, after=after, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"unreachable_ips": ips, "next": cursor}
+
+
+@app.get("/hosts/")
+async def get_hosts(state: Optional[Literal["up", "down"]] = None, after: str = None,
+                    limit: int = Query(100, ge=1, le=1000)):
+    """Retrieves a page of per-host results.
+
+    Args:
+        state (str): "up" or "down" to filter by state; all hosts when omitted.
+        after (str): Return hosts after this address; use the "next" value of the previous page.
+        limit (int): The maximum number of hosts to return.
+
+    Returns:
+        dict: The page of host records, the next cursor and per-state counts.
+    """
+    reachable = None if state is None else state == "up"
+    try:
+        hosts, cursor = results.page(reachable=reachable, after=after, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"hosts": hosts, "next": cursor, "counts": results.counts()}
+
+
+@app.get("/events/")
+async def stream_events(request: Request, transitions_only: bool = False):
+    """Streams per-host scan results as Server-Sent Events.
+
+    Args:
+        request (Request): The incoming request.
+        transitions_only (bool): Only send results where the host changed state.
+
+    Returns:
+        StreamingResponse: An open "text/event-stream" response.
+    """
+    subscriber = Subscriber()
+    subscribers[subscriber] = transitions_only
+
+    async def event_stream():
+        try:
+            async for message in subscriber.stream(request, "result"):
+                yield message
+        finally:
+            subscribers.pop(subscriber, None)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 
 @app.get("/scan/")
@@ -1,50 +1,143 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
 import asyncio
+import heapq
+import os
+import time
 import httpx
 import signal
 import sys
 
+# The probes and result store shared with the other apps live in rakort/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from rakort.netprobe import ResultStore, Subscriber, get_probe  # noqa: E402
+
 app = FastAPI()
 
-# List to store unreachable IP addresses
-unreachable_ips = []
+# Latest probe result per IP address
+results = ResultStore()
 
 # IP addresses to ping (from 192.168.1.1 to 192.168.1.255)
 ip_addresses = [f"192.168.1.{i}" for i in range(1, 256)]  # Valid IP addresses
 
+# Reachability probe used by the ping loop: "http", "tcp" or "icmp"
+probe_backend = os.environ.get("PROBE_BACKEND", "http")
+
+# Maximum number of hosts probed at the same time; also the HTTP pool size
+ping_concurrency = int(os.environ.get("PING_CONCURRENCY", "100"))
+
+# Adaptive scheduling: a host that just changed state is re-probed after the
+# minimum interval, and every probe confirming its state doubles the interval
+# up to the maximum
+base_interval = float(os.environ.get("PING_INTERVAL", "5"))
+min_interval = float(os.environ.get("PING_MIN_INTERVAL", "1"))
+max_interval = float(os.environ.get("PING_MAX_INTERVAL", "60"))
+
+# Callbacks receiving state transition events
+transition_listeners = []
+
 # Global variable to control the running state of the ping operation
 running = True
 
 
-async def ping_ip(ip: str):
+def add_transition_listener(callback):
+    """Registers a callback for host state transitions.
+
+    The callback is called on the event loop with a dictionary holding the
+    "ip", the "previous" state (None for a host seen for the first time), the
+    new "reachable" state, the failure "reason" and a "timestamp". It must not
+    block.
+
+    Args:
+        callback (callable): The function to call for every transition.
+    """
+    transition_listeners.append(callback)
+
+
+def remove_transition_listener(callback):
+    """Unregisters a callback added with ``add_transition_listener``."""
+    transition_listeners.remove(callback)
+
+
+def emit_transition(ip: str, previous, reachable: bool, reason: str = None):
+    """Sends a state transition to every registered listener."""
+    event = {"ip": ip, "previous": previous, "reachable": reachable,
+             "reason": reason, "timestamp": time.time()}
+    for listener in list(transition_listeners):
+        listener(event)
+
+
+async def ping_ip(ip: str, probe):
     """Pings the specified IP address and checks its reachability.
 
     Args:
         ip (str): The IP address to ping.
+        probe (callable): The reachability probe returned by ``get_probe``.
+
+    Returns:
+        bool: True if the host changed state since its previous probe.
     """
-    async with httpx.AsyncClient() as client:
-        try:
-            # Send an HTTP request to the IP address
-            response = await client.get(f"http://{ip}", timeout=2.0)
-            if response.status_code == 200:
-                return  # Only return if reachable, do nothing
-        except (httpx.RequestError, httpx.HTTPStatusError) as e:
-            # Print only if the IP is unreachable
-            print(f"{ip} is unreachable: {e}")
-            unreachable_ips.append(ip)
+    reachable, reason = await probe(ip)
+    previous = results.record(ip, reachable)
+    if previous == reachable:
+        return False
 
+    # Print only state transitions
+    if reachable:
+        print(f"{ip} is reachable.")
+    else:
+        print(f"{ip} is unreachable: {reason}")
+    emit_transition(ip, previous, reachable, reason)
+    return previous is not None
 
-async def ping_all_ips():
+
+async def ping_all_ips(backend: str = probe_backend):
     """Pings all specified IP addresses in a loop.
 
-    This function continuously pings the IP addresses in the ip_addresses list.
-    It collects the unreachable IPs every 5 seconds.
+    Every host has its own deadline in a heap. Hosts that keep their state are
+    probed less and less often, while a host that just went up or down is
+    probed again quickly, so flapping hosts stay on a short interval.
+
+    Args:
+        backend (str): The reachability probe to use: "http", "tcp" or "icmp".
     """
-    while running:  # Continue pinging while running is True
-        tasks = [ping_ip(ip) for ip in ip_addresses]  # Ping all IP addresses
-        await asyncio.gather(*tasks)  # Run all ping tasks concurrently
-        print("Skipped pinging for 5 seconds, preparing for the next cycle...")
-        await asyncio.sleep(5)  # Wait for 5 seconds before the next ping
+    loop = asyncio.get_running_loop()
+    intervals = dict.fromkeys(ip_addresses, base_interval)
+    schedule = [(loop.time(), ip) for ip in ip_addresses]
+    heapq.heapify(schedule)
+
+    # At most ping_concurrency probes run at once, so none of them waits for a
+    # pooled connection and times out before it has even been sent
+    limits = httpx.Limits(max_connections=ping_concurrency,
+                          max_keepalive_connections=0)
+    slots = asyncio.Semaphore(ping_concurrency)
+
+    async with httpx.AsyncClient(limits=limits) as client:
+        probe = get_probe(backend, client)
+
+        async def bounded_ping(ip):
+            async with slots:
+                return await ping_ip(ip, probe)
+
+        while running and schedule:  # Continue pinging while running is True
+            now = loop.time()
+            due = []
+            while schedule and schedule[0][0] <= now:
+                due.append(heapq.heappop(schedule)[1])
+
+            if due:
+                changes = await asyncio.gather(*(bounded_ping(ip) for ip in due))
+                finished = loop.time()
+                for ip, changed in zip(due, changes):
+                    if changed:
+                        intervals[ip] = min_interval
+                    else:
+                        intervals[ip] = min(intervals[ip] * 2, max_interval)
+                    heapq.heappush(schedule, (finished + intervals[ip], ip))
+
+            # Sleep until the next host is due
+            await asyncio.sleep(max(0.0, schedule[0][0] - loop.time()))
 
 
 @app.on_event("startup")
@@ -72,10 +165,62 @@ signal.signal(signal.SIGINT, signal_handler)
 
 
 @app.get("/unreachable/")
-async def get_unreachable_ips():
-    """Retrieves the list of unreachable IP addresses.
+async def get_unreachable_ips(after: str = None, limit: int = Query(100, ge=1, le=1000)):
+    """Retrieves a page of unreachable IP addresses.
+
+    Args:
+        after (str): Return addresses after this one; use the "next" value of the previous page.
+        limit (int): The maximum number of addresses to return.
+
+    Returns:
+        dict: A dictionary containing the page of unreachable IP addresses and the next cursor.
+    """
+    try:
+        ips, cursor = results.page_ips(reachable=False, after=after, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"unreachable_ips": ips, "next": cursor}
+
+
+@app.get("/hosts/")
+async def get_hosts(state: Optional[Literal["up", "down"]] = None, after: str = None,
+                    limit: int = Query(100, ge=1, le=1000)):
+    """Retrieves a page of per-host results.
+
+    Args:
+        state (str): "up" or "down" to filter by state; all hosts when omitted.
+        after (str): Return hosts after this address; use the "next" value of the previous page.
+        limit (int): The maximum number of hosts to return.
 
     Returns:
-        dict: A dictionary containing the list of unreachable IP addresses.
+        dict: The page of host records, the next cursor and per-state counts.
     """
-    return {"unreachable_ips": unreachable_ips}
+    reachable = None if state is None else state == "up"
+    try:
+        hosts, cursor = results.page(reachable=reachable, after=after, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"hosts": hosts, "next": cursor, "counts": results.counts()}
+
+
+@app.get("/events/")
+async def stream_events(request: Request):
+    """Streams host state transitions as Server-Sent Events.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        StreamingResponse: An open "text/event-stream" response.
+    """
+    subscriber = Subscriber()
+    add_transition_listener(subscriber.put)
+
+    async def event_stream():
+        try:
+            async for message in subscriber.stream(request, "transition"):
+                yield message
+        finally:
+            remove_transition_listener(subscriber.put)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
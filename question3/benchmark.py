@@ -0,0 +1,130 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import resource
+import sys
+import tempfile
+import time
+
+
+def peak_rss_kb():
+    """Return the peak resident set size of this process in kilobytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def database_size(path):
+    """Return the size in bytes of a SQLite database including its WAL file."""
+    return sum(os.path.getsize(name) for name in (path, path + '-wal')
+               if os.path.exists(name))
+
+
+def _phase(operation, **kwargs):
+    """Run one CRUD operation and summarize its per-table statistics."""
+    start_time = time.perf_counter()
+    tables = operation(**kwargs)
+    elapsed = time.perf_counter() - start_time
+    rows = sum(table["rows"] for table in tables)
+    return {"seconds": elapsed, "rows": rows,
+            "rows_per_sec": rows / elapsed if elapsed else 0.0, "tables": tables}
+
+
+def run_case(strategy, scale, seed, num_updates, num_deletes, directory, results,
+             database_url=None):
+    """Benchmark one strategy at one scale against a fresh database.
+
+    Runs in its own process so that peak RSS and module state belong to this
+    case only. database_url replaces the default per-case SQLite file, so
+    other backends can run the same workload.
+    """
+    path = os.path.join(directory, f'{strategy}_{scale}.db')
+    os.chdir(directory)
+    import sql
+    sql.configure_engine(database_url or f'sqlite:///{path}')
+    sql.Base.metadata.drop_all(sql.get_engine())
+    sql.init_schema()
+
+    random.seed(seed)
+    phases = {
+        "insert": _phase(sql.insert_data, num_users=scale, method=strategy),
+        "update": _phase(sql.update_data, num_updates=num_updates, method=strategy),
+        "delete": _phase(sql.delete_data, num_deletes=num_deletes),
+    }
+    results.put({"strategy": strategy, "scale": scale, "seed": seed,
+                 "phases": phases, "peak_rss_kb": peak_rss_kb(),
+                 "db_size_bytes": database_size(path)})
+    sql.get_engine().dispose()
+
+
+def _wait_for_result(process, results, poll_interval=1.0):
+    """Return the result of a case process, or raise if it exits without one."""
+    while True:
+        try:
+            return results.get(timeout=poll_interval)
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        # The process has exited; pick up a result it sent just before
+        try:
+            return results.get(timeout=poll_interval)
+        except queue.Empty:
+            process.join()
+            raise RuntimeError(
+                f"Benchmark case exited with code {process.exitcode} without a result")
+
+
+def run_benchmark(scales, strategies, seed=0, num_updates=10000, num_deletes=1000,
+                  database_url=None):
+    """Run every strategy at every scale and return the list of results."""
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        for scale in scales:
+            for strategy in strategies:
+                results = context.Queue()
+                process = context.Process(target=run_case, args=(
+                    strategy, scale, seed, num_updates, num_deletes, directory, results,
+                    database_url))
+                process.start()
+                try:
+                    run = _wait_for_result(process, results)
+                finally:
+                    process.join()
+                runs.append(run)
+                print(f"{strategy} x {scale}: " + ", ".join(
+                    f"{name} {phase['rows_per_sec']:.0f} rows/sec"
+                    for name, phase in run["phases"].items()))
+    return runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark insert_data, update_data and delete_data.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[10000, 100000],
+                        help="Numbers of users to insert (products are twice that).")
+    parser.add_argument('--strategies', nargs='+', default=['orm', 'core', 'raw'],
+                        choices=['orm', 'core', 'raw'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--updates', type=int, default=10000)
+    parser.add_argument('--deletes', type=int, default=1000)
+    parser.add_argument('--database-url',
+                        help="SQLAlchemy URL to benchmark instead of a fresh SQLite file.")
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    import sqlalchemy
+    report = {
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "runs": run_benchmark(args.scales, args.strategies, args.seed,
+                              args.updates, args.deletes, args.database_url),
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Benchmark results saved to {args.output}.")
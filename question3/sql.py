@@ -1,15 +1,45 @@
+import os
+import sys
 import time
 import random
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, DateTime
-from sqlalchemy.orm import declarative_base, sessionmaker
+import itertools
+import re
+from contextlib import contextmanager
+from sqlalchemy import select, update, delete, bindparam, Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy.orm import declarative_base
 from sqlalchemy import func
 
+# The engine factory shared with question4 lives in rakort/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from rakort.database import Database, create_indexes as _create_indexes  # noqa: E402
+
 # Database connection
-DATABASE_URL = "sqlite:///example.db"
-engine = create_engine(DATABASE_URL, echo=False)
-Session = sessionmaker(bind=engine)
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///example.db")
+
+# Rows written per transaction by the CRUD functions; 0 commits once per table
+COMMIT_EVERY = int(os.environ.get("COMMIT_EVERY", "0"))
+
+
+def configure_engine(url=DATABASE_URL, commit_every=None, **options):
+    """Point the module at a new database and return its engine.
+
+    options are passed to create_database_engine; commit_every replaces
+    COMMIT_EVERY when given.
+    """
+    global COMMIT_EVERY
+    if commit_every is not None:
+        COMMIT_EVERY = commit_every
+    return database.configure(url, **options)
+
+
 Base = declarative_base()
 
+# Engine, sessions and schema, all created lazily so importing the module does no I/O
+database = Database(DATABASE_URL, Base.metadata)
+Session = database.Session
+get_engine = database.get_engine
+init_schema = database.init_schema
+
 # User Model
 
 
@@ -18,7 +48,7 @@ class User(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String)
-    email = Column(String)
+    email = Column(String, index=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(),
                         onupdate=func.now())
@@ -33,8 +63,8 @@ class Product(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String)
-    price = Column(Float)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    price = Column(Float, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     created_at = Column(DateTime, server_default=func.now())
     description = Column(String)
     quantity = Column(Integer)
@@ -51,176 +81,509 @@ class Category(Base):
     updated_at = Column(DateTime, server_default=func.now(),
                         onupdate=func.now())
     description = Column(String)
-    parent_id = Column(Integer, ForeignKey('categories.id'))
+    parent_id = Column(Integer, ForeignKey('categories.id'), index=True)
 
 
-# Create tables
-Base.metadata.create_all(engine)
+# Mapped class for each table name, used by the ORM strategies
+MODELS = {model.__tablename__: model for model in (User, Product, Category)}
 
 
-def insert_data(num_users=100000, num_products_per_user=2, num_categories=100, batch_size=1000):
-    """Insert user, product, and category data."""
-    session = Session()
+def create_indexes(bind=None):
+    """Create every declared index that does not exist yet.
 
-    # Add categories in bulk
-    categories = [
-        {"name": f'Category {i}', "description": f'Description for Category {i}'}
-        for i in range(num_categories)
-    ]
-    session.execute(Category.__table__.insert(), categories)
+    Use it after a bulk load with defer_indexes, or to upgrade a database
+    created before the indexes were declared.
+    """
+    _create_indexes(bind or init_schema(), Base.metadata)
+
+
+def _batched(rows, batch_size):
+    """Yield lists of up to batch_size rows from any iterable."""
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
 
-    # Add users and products in bulk
-    users = []
-    products = []
 
+def _transactions(rows, batch_size):
+    """Yield lazy groups of batches, each group to be written in one transaction.
+
+    A group holds about COMMIT_EVERY rows, or every row when it is 0. Each
+    group must be consumed before the next one is requested.
+    """
+    batches = _batched(rows, batch_size)
+    per_transaction = -(-COMMIT_EVERY // batch_size)
+    for first in batches:
+        rest = itertools.islice(batches, per_transaction - 1) if per_transaction else batches
+        yield itertools.chain([first], rest)
+
+
+def generate_categories(num_categories, first_id=1):
+    """Yield category rows as tuples in CATEGORY_COLUMNS order.
+
+    The categories form a tree where every category has up to ten children.
+    """
+    for i in range(num_categories):
+        parent_id = first_id + (i - 1) // 10 if i else None
+        yield (first_id + i, f'Category {i}', f'Description for Category {i}', parent_id)
+
+
+def generate_users(num_users, first_id=1):
+    """Yield user rows as tuples in USER_COLUMNS order."""
     for i in range(num_users):
-        user = {"name": f'User {i}', "email": f'user{i}@example.com',
-                "age": random.randint(18, 70), "address": f'Address {i}'}
-        users.append(user)
+        yield (first_id + i, f'User {i}', f'user{i}@example.com',
+               random.randint(18, 70), f'Address {i}')
 
-        # Create several products for each user
+
+def generate_products(num_users, num_products_per_user, first_user_id=1):
+    """Yield product rows as tuples in PRODUCT_COLUMNS order."""
+    for i in range(num_users):
         for j in range(num_products_per_user):
-            product = {"name": f'Product {j} of User {i}', "price": random.uniform(10, 100), "user_id": i,
-                       "description": f'Description for Product {j} of User {i}', "quantity": random.randint(1, 50)}
-            products.append(product)
-
-        # Commit in batches
-        if (i + 1) % batch_size == 0:
-            session.execute(User.__table__.insert(), users)
-            session.execute(Product.__table__.insert(), products)
-            users.clear()
-            products.clear()
-
-    # Insert remaining users and products
-    if users:
-        session.execute(User.__table__.insert(), users)
-    if products:
-        session.execute(Product.__table__.insert(), products)
-
-    session.commit()
-    session.close()
-
-
-def update_data(batch_size=1000):
-    """Randomly update users and products in batches."""
-    session = Session()
-
-    # Get all user IDs and product IDs for faster access
-    user_ids = [user.id for user in session.query(User).all()]
-    product_ids = [product.id for product in session.query(Product).all()]
-
-    updates = []
-    for _ in range(1000):  # Prepare 1000 updates
-        # Update a random user
-        user_id = random.choice(user_ids)
-        updates.append({
-            "id": user_id,
-            "name": f'Updated User {user_id}',
-            "age": random.randint(18, 70),
-            "address": f'Updated Address'
-        })
-
-        # Update a random product
-        product_id = random.choice(product_ids)
-        updates.append({
-            "id": product_id,
-            "price": random.uniform(10, 100),
-            "description": f'Updated Description for Product {product_id}',
-            "quantity": random.randint(1, 50)
-        })
-
-        # Commit updates in batches
-        if len(updates) >= batch_size:
-            # Separate updates for users and products
-            user_updates = [
-                update for update in updates if 'user_id' in update]
-            product_updates = [
-                update for update in updates if 'product_id' in update]
-            session.bulk_update_mappings(User, user_updates)
-            session.bulk_update_mappings(Product, product_updates)
-            updates.clear()
-
-    # Apply any remaining updates
-    if updates:
-        user_updates = [update for update in updates if 'user_id' in update]
-        product_updates = [
-            update for update in updates if 'product_id' in update]
-        session.bulk_update_mappings(User, user_updates)
-        session.bulk_update_mappings(Product, product_updates)
-
-    session.commit()
-    session.close()
-
-
-def delete_data(batch_size=1000):
-    """Randomly delete users and products in batches."""
-    session = Session()
-
-    # Get all user IDs and product IDs for faster access
-    user_ids = [user.id for user in session.query(User).all()]
-    product_ids = [product.id for product in session.query(Product).all()]
-
-    deletes = []
-    for _ in range(1000):  # Prepare 1000 deletions
-        # Delete a random user
-        user_id = random.choice(user_ids)
-        deletes.append({"id": user_id, "type": "user"})
-
-        # Delete a random product
-        product_id = random.choice(product_ids)
-        deletes.append({"id": product_id, "type": "product"})
-
-        # Commit deletions in batches
-        if len(deletes) >= batch_size:
-            user_deletes = [d['id'] for d in deletes if d['type'] == "user"]
-            product_deletes = [d['id']
-                               for d in deletes if d['type'] == "product"]
-
-            # Delete users
-            if user_deletes:
-                session.query(User).filter(User.id.in_(user_deletes)).delete(
-                    synchronize_session=False)
-
-            # Delete products
-            if product_deletes:
-                session.query(Product).filter(Product.id.in_(
-                    product_deletes)).delete(synchronize_session=False)
-
-            deletes.clear()
-
-    # Apply any remaining deletions
-    if deletes:
-        user_deletes = [d['id'] for d in deletes if d['type'] == "user"]
-        product_deletes = [d['id'] for d in deletes if d['type'] == "product"]
-
-        # Delete users
-        if user_deletes:
-            session.query(User).filter(User.id.in_(user_deletes)
-                                       ).delete(synchronize_session=False)
-
-        # Delete products
-        if product_deletes:
-            session.query(Product).filter(Product.id.in_(
-                product_deletes)).delete(synchronize_session=False)
-
-    session.commit()
-    session.close()
+            yield (f'Product {j} of User {i}', random.uniform(10, 100), first_user_id + i,
+                   f'Description for Product {j} of User {i}', random.randint(1, 50))
+
+
+# SQLite's default limit on bound parameters per statement
+MAX_SQL_VARIABLES = 999
+
+# Attempts made by sample_ids to fill a sample from a sparse id range
+SAMPLE_ROUNDS = 10
+
+CATEGORY_COLUMNS = ('id', 'name', 'description', 'parent_id')
+USER_COLUMNS = ('id', 'name', 'email', 'age', 'address')
+PRODUCT_COLUMNS = ('name', 'price', 'user_id', 'description', 'quantity')
+
+
+@contextmanager
+def bulk_load_pragmas(dbapi_connection, cache_size_kb=200000):
+    """Apply SQLite pragmas tuned for bulk loading, restoring them afterwards.
+
+    WAL lets readers continue during the load, synchronous=OFF skips the fsync
+    per commit and a large page cache keeps the B-trees in memory. WAL mode is
+    persistent and stays on. Other backends are left untouched.
+    """
+    if get_engine().dialect.name != 'sqlite':
+        yield
+        return
+
+    cursor = dbapi_connection.cursor()
+    synchronous = cursor.execute("PRAGMA synchronous").fetchone()[0]
+    cache_size = cursor.execute("PRAGMA cache_size").fetchone()[0]
+
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute(f"PRAGMA cache_size=-{int(cache_size_kb)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    try:
+        yield
+    finally:
+        cursor.execute(f"PRAGMA synchronous={int(synchronous)}")
+        cursor.execute(f"PRAGMA cache_size={int(cache_size)}")
+        cursor.close()
+
+
+def _load_orm(connection, table, columns, rows, batch_size):
+    """Load rows as mapped ORM objects through a Session, one flush per batch."""
+    model = MODELS[table.name]
+    with Session(bind=connection) as session:
+        for transaction in _transactions(rows, batch_size):
+            for batch in transaction:
+                session.add_all([model(**dict(zip(columns, row))) for row in batch])
+                session.flush()
+            session.commit()
+
+
+def _load_core(connection, table, columns, rows, batch_size):
+    """Load rows through SQLAlchemy Core, one insert of dicts per batch."""
+    for transaction in _transactions(rows, batch_size):
+        with connection.begin():
+            for batch in transaction:
+                connection.execute(
+                    table.insert(), [dict(zip(columns, row)) for row in batch])
+
+
+def _load_raw(connection, table, columns, rows, batch_size):
+    """Load row tuples with executemany on the raw DBAPI connection."""
+    statement = str(table.insert().compile(
+        dialect=get_engine().dialect, column_keys=list(columns)))
+    positional = get_engine().dialect.positional
+    dbapi_connection = connection.connection
+    cursor = dbapi_connection.cursor()
+    for transaction in _transactions(rows, batch_size):
+        for batch in transaction:
+            cursor.executemany(
+                statement, batch if positional else [dict(zip(columns, row)) for row in batch])
+        dbapi_connection.commit()
+    cursor.close()
+
+
+# Available bulk-load strategies, selected with insert_data(method=...)
+LOADERS = {
+    'orm': _load_orm,
+    'core': _load_core,
+    'raw': _load_raw,
+}
+
+
+class _Counter:
+    """Iterable wrapper counting the rows that pass through it."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            yield row
+
+
+def bulk_load(table, columns, rows, batch_size=10000, method='raw', defer_indexes=False):
+    """Stream row tuples into a table and return the load statistics.
+
+    columns gives the column order of each tuple, method picks one of LOADERS
+    and defer_indexes drops the table's secondary indexes for the load and
+    builds them once at the end.
+    """
+    loader = LOADERS[method]
+    counted = _Counter(rows)
+    indexes = list(table.indexes) if defer_indexes else []
+
+    start_time = time.perf_counter()
+    with init_schema().connect() as connection:
+        with bulk_load_pragmas(connection.connection):
+            with connection.begin():
+                for index in indexes:
+                    index.drop(connection, checkfirst=True)
+            loader(connection, table, columns, counted, batch_size)
+            with connection.begin():
+                for index in indexes:
+                    index.create(connection, checkfirst=True)
+    elapsed = time.perf_counter() - start_time
+
+    return _report("Loaded", table, counted.count, elapsed)
+
+
+def insert_data(num_users=100000, num_products_per_user=2, num_categories=100, batch_size=10000,
+                method='raw', defer_indexes=False):
+    """Insert user, product, and category data.
+
+    Rows are generated lazily as tuples and streamed into each table with
+    the selected loader. Returns the per-table load statistics.
+    """
+    # Continue numbering after any rows left by a previous run
+    with init_schema().connect() as connection:
+        first_user_id = (connection.execute(
+            select(func.max(User.id))).scalar() or 0) + 1
+        first_category_id = (connection.execute(
+            select(func.max(Category.id))).scalar() or 0) + 1
+
+    return [
+        bulk_load(Category.__table__, CATEGORY_COLUMNS, generate_categories(num_categories, first_category_id),
+                  batch_size, method, defer_indexes),
+        bulk_load(User.__table__, USER_COLUMNS, generate_users(num_users, first_user_id),
+                  batch_size, method, defer_indexes),
+        bulk_load(Product.__table__, PRODUCT_COLUMNS,
+                  generate_products(num_users, num_products_per_user, first_user_id),
+                  batch_size, method, defer_indexes),
+    ]
+
+
+def sample_ids(connection, table, count, exclude=()):
+    """Return up to count distinct existing ids of table, picked at random.
+
+    Candidates are drawn from the table's id range and checked with indexed
+    primary-key lookups, so only id values are ever loaded into Python. Ids
+    in exclude are never returned.
+    """
+    exclude = set(exclude)
+    wanted = count + len(exclude)
+    low, high = connection.execute(
+        select(func.min(table.c.id), func.max(table.c.id))).one()
+    if low is None or count <= 0:
+        return []
+    if high - low + 1 <= wanted:
+        ids = [id_ for id_ in connection.execute(select(table.c.id)).scalars()
+               if id_ not in exclude]
+        return random.sample(ids, min(count, len(ids)))
+
+    found = set()
+    for _ in range(SAMPLE_ROUNDS):
+        needed = wanted - len(found)
+        if needed <= 0:
+            break
+        candidates = set(random.sample(range(low, high + 1),
+                                       min(needed * 2, high - low + 1))) - found
+        for chunk in _batched(candidates, MAX_SQL_VARIABLES):
+            found.update(connection.execute(
+                select(table.c.id).where(table.c.id.in_(chunk))).scalars())
+    # Sets of small ints iterate in ascending order, so slicing would favour low ids
+    found = sorted(found - exclude)
+    return random.sample(found, min(count, len(found)))
+
+
+def _compile(statement):
+    """Compile a Core statement to SQL text and its parameter names in bind order."""
+    compiled = statement.compile(dialect=get_engine().dialect)
+    return str(compiled), compiled.positiontup
+
+
+def _execute_many(connection, statement, rows, batch_size):
+    """Run statement with executemany on the raw DBAPI connection.
+
+    rows are dicts keyed by bind parameter name; they are converted to tuples
+    for positional DBAPI drivers. Returns the number of rows sent.
+    """
+    sql, names = _compile(statement)
+    dbapi_connection = connection.connection
+    cursor = dbapi_connection.cursor()
+    count = 0
+    for transaction in _transactions(rows, batch_size):
+        for batch in transaction:
+            if names is not None:
+                batch = [tuple(row[name] for name in names) for row in batch]
+            cursor.executemany(sql, batch)
+            count += len(batch)
+        dbapi_connection.commit()
+    cursor.close()
+    return count
+
+
+def _update_core(connection, table, statement, rows, batch_size):
+    """Run the update through SQLAlchemy Core, one executemany per batch."""
+    count = 0
+    for transaction in _transactions(rows, batch_size):
+        with connection.begin():
+            for batch in transaction:
+                connection.execute(statement, batch)
+                count += len(batch)
+    return count
+
+
+def _update_orm(connection, table, statement, rows, batch_size):
+    """Run the update as ORM bulk_update_mappings, one flush per batch."""
+    model = MODELS[table.name]
+    count = 0
+    with Session(bind=connection) as session:
+        for transaction in _transactions(rows, batch_size):
+            for batch in transaction:
+                session.bulk_update_mappings(
+                    model, [{"id": row.pop("target_id"), **row} for row in batch])
+                count += len(batch)
+            session.commit()
+    return count
+
+
+def _update_raw(connection, table, statement, rows, batch_size):
+    """Run the update with executemany on the raw DBAPI connection."""
+    return _execute_many(connection, statement, rows, batch_size)
+
+
+# Available update strategies, selected with update_data(method=...)
+UPDATERS = {
+    'orm': _update_orm,
+    'core': _update_core,
+    'raw': _update_raw,
+}
+
+
+def _report(action, table, rows, elapsed):
+    """Print and return throughput statistics for one table."""
+    stats = {"table": table.name, "rows": rows, "seconds": elapsed,
+             "rows_per_sec": rows / elapsed if elapsed else 0.0}
+    print(f"{action} {rows} rows in {table.name} in {elapsed:.2f} seconds "
+          f"({stats['rows_per_sec']:.0f} rows/sec).")
+    return stats
+
+
+def update_data(num_updates=10000, batch_size=1000, method='raw'):
+    """Randomly update users and products in batches.
+
+    Target ids are sampled in SQL and deduplicated, then each table is
+    updated with executemany UPDATE statements through the method picked
+    from UPDATERS. Returns the per-table throughput statistics.
+    """
+    updater = UPDATERS[method]
+    users = User.__table__
+    products = Product.__table__
+    user_update = update(users).where(users.c.id == bindparam('target_id')).values(
+        name=bindparam('name'), age=bindparam('age'), address=bindparam('address'))
+    product_update = update(products).where(products.c.id == bindparam('target_id')).values(
+        price=bindparam('price'), description=bindparam('description'),
+        quantity=bindparam('quantity'))
+
+    def user_rows(ids):
+        for user_id in ids:
+            yield {"target_id": user_id, "name": f'Updated User {user_id}',
+                   "age": random.randint(18, 70), "address": 'Updated Address'}
+
+    def product_rows(ids):
+        for product_id in ids:
+            yield {"target_id": product_id, "price": random.uniform(10, 100),
+                   "description": f'Updated Description for Product {product_id}',
+                   "quantity": random.randint(1, 50)}
+
+    stats = []
+    with init_schema().connect() as connection:
+        for table, statement, rows in ((users, user_update, user_rows),
+                                       (products, product_update, product_rows)):
+            start_time = time.perf_counter()
+            with connection.begin():
+                ids = sample_ids(connection, table, num_updates)
+            count = updater(connection, table, statement, rows(ids), batch_size)
+            stats.append(_report("Updated", table, count,
+                                 time.perf_counter() - start_time))
+    return stats
+
+
+def delete_data(num_deletes=1000, batch_size=MAX_SQL_VARIABLES, on_user_delete='cascade',
+                reassign_to=None):
+    """Randomly delete users and products in size-bounded chunks.
+
+    Ids are sampled in SQL and deleted in chunks that stay under SQLite's
+    bound-parameter limit. The products of each deleted user are deleted in
+    the same transaction ('cascade') or handed to reassign_to ('reassign',
+    None leaves them without an owner). reassign_to must be an existing user
+    and is never picked for deletion. Returns the per-table statistics.
+    """
+    if on_user_delete not in ('cascade', 'reassign'):
+        raise ValueError(f"Unknown on_user_delete mode: {on_user_delete}")
+    reassigning = on_user_delete == 'reassign' and reassign_to is not None
+    users = User.__table__
+    products = Product.__table__
+    chunk_size = min(batch_size, MAX_SQL_VARIABLES)
+
+    stats = []
+    with init_schema().connect() as connection:
+        # Delete users together with their dependent products
+        start_time = time.perf_counter()
+        with connection.begin():
+            if reassigning and connection.execute(select(users.c.id).where(
+                    users.c.id == reassign_to)).first() is None:
+                raise ValueError(f"Cannot reassign products to missing user {reassign_to}")
+            user_ids = sample_ids(connection, users, num_deletes,
+                                  exclude=[reassign_to] if reassigning else ())
+        deleted_users = dependents = 0
+        for chunk in _batched(user_ids, chunk_size):
+            with connection.begin():
+                if on_user_delete == 'cascade':
+                    result = connection.execute(
+                        delete(products).where(products.c.user_id.in_(chunk)))
+                else:
+                    result = connection.execute(
+                        update(products).where(products.c.user_id.in_(chunk))
+                        .values(user_id=reassign_to))
+                dependents += result.rowcount
+                deleted_users += connection.execute(
+                    delete(users).where(users.c.id.in_(chunk))).rowcount
+        stats.append(_report("Deleted", users, deleted_users,
+                             time.perf_counter() - start_time))
+        print(f"{'Deleted' if on_user_delete == 'cascade' else 'Reassigned'} "
+              f"{dependents} products of deleted users.")
+
+        # Delete random products
+        start_time = time.perf_counter()
+        with connection.begin():
+            product_ids = sample_ids(connection, products, num_deletes)
+        deleted_products = 0
+        for chunk in _batched(product_ids, chunk_size):
+            with connection.begin():
+                deleted_products += connection.execute(
+                    delete(products).where(products.c.id.in_(chunk))).rowcount
+        stats.append(_report("Deleted", products, deleted_products,
+                             time.perf_counter() - start_time))
+    return stats
+
+
+def products_for_user_query(user_id):
+    """Select the products owned by a user."""
+    products = Product.__table__
+    return select(products).where(products.c.user_id == user_id)
+
+
+def category_subtree_query(root_id):
+    """Select a category and all of its descendants with a recursive CTE."""
+    categories = Category.__table__
+    subtree = select(categories.c.id, categories.c.name, categories.c.parent_id).where(
+        categories.c.id == root_id).cte('subtree', recursive=True)
+    children = categories.alias('children')
+    subtree = subtree.union_all(
+        select(children.c.id, children.c.name, children.c.parent_id).where(
+            children.c.parent_id == subtree.c.id))
+    return select(subtree)
+
+
+def price_range_query(low, high, limit=100):
+    """Select up to limit products priced between low and high, cheapest first."""
+    products = Product.__table__
+    return (select(products).where(products.c.price.between(low, high))
+            .order_by(products.c.price).limit(limit))
+
+
+def products_for_user(user_id):
+    """Return the products owned by a user."""
+    with init_schema().connect() as connection:
+        return connection.execute(products_for_user_query(user_id)).all()
+
+
+def category_subtree(root_id):
+    """Return a category and all of its descendants."""
+    with init_schema().connect() as connection:
+        return connection.execute(category_subtree_query(root_id)).all()
+
+
+def products_in_price_range(low, high, limit=100):
+    """Return up to limit products priced between low and high, cheapest first."""
+    with init_schema().connect() as connection:
+        return connection.execute(price_range_query(low, high, limit)).all()
+
+
+def explain_query_plan(statement):
+    """Return the SQLite EXPLAIN QUERY PLAN details for a Core statement."""
+    bind = init_schema()
+    compiled = statement.compile(dialect=bind.dialect)
+    with bind.connect() as connection:
+        cursor = connection.connection.cursor()
+        cursor.execute(f"EXPLAIN QUERY PLAN {compiled}",
+                       [compiled.params[name] for name in compiled.positiontup])
+        details = [row[-1] for row in cursor.fetchall()]
+        cursor.close()
+    return details
+
+
+def check_query_plans():
+    """Check that the lookup queries use indexes instead of full table scans.
+
+    Returns the plan of each query and raises AssertionError if any of them
+    scans one of the model tables. Only meaningful on SQLite.
+    """
+    # "children" is the alias of categories inside the recursive CTE, and an
+    # AUTOMATIC index is built from a full scan on every execution
+    table_scan = re.compile(
+        r'^SCAN (%s)\b(?!.*USING)|AUTOMATIC' % '|'.join([*MODELS, 'children']))
+    plans = {
+        "products_for_user": explain_query_plan(products_for_user_query(1)),
+        "category_subtree": explain_query_plan(category_subtree_query(1)),
+        "price_range": explain_query_plan(price_range_query(10, 20)),
+    }
+    for name, details in plans.items():
+        scans = [detail for detail in details if table_scan.search(detail)]
+        assert not scans, f"{name} scans a full table: {scans}"
+    return plans
 
 
 if __name__ == "__main__":
-    start_time = time.time()
-
-    # Insert data
-    insert_data()
-    print(
-        f"Insert operation completed. Time: {time.time() - start_time:.2f} seconds.")
-
-    # Update operation
-    update_data()
-    print(
-        f"Update operation completed. Time: {time.time() - start_time:.2f} seconds.")
-
-    # Delete operation
-    delete_data()
-    print(
-        f"Delete operation completed. Time: {time.time() - start_time:.2f} seconds.")
+    # Fixed seed so repeated runs generate the same data
+    random.seed(0)
+
+    for name, operation in (("Insert", insert_data), ("Update", update_data),
+                            ("Delete", delete_data)):
+        start_time = time.perf_counter()
+        operation()
+        print(
+            f"{name} operation completed. Time: {time.perf_counter() - start_time:.2f} seconds.")
+
+    for name, details in check_query_plans().items():
+        print(f"{name} query plan: {'; '.join(details)}")
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+import sql
+
+
+@pytest.fixture(autouse=True)
+def database():
+    """Give every test a fresh, small in-memory database."""
+    random.seed(0)
+    sql.configure_engine('sqlite://')
+    sql.init_schema()
+    sql.insert_data(num_users=50, num_products_per_user=2, num_categories=100)
+    yield
+    sql.get_engine().dispose()
+
+
+def test_lookup_queries_use_indexes():
+    plans = sql.check_query_plans()
+    assert set(plans) == {"products_for_user", "category_subtree", "price_range"}
+
+
+def test_products_for_user():
+    products = sql.products_for_user(3)
+    assert len(products) == 2
+    assert all(product.user_id == 3 for product in products)
+
+
+def test_category_subtree():
+    # Category 2 has the ten children 12..21, which have no children
+    subtree = sql.category_subtree(2)
+    assert sorted(row.id for row in subtree) == [2, *range(12, 22)]
+    assert len(sql.category_subtree(1)) == 100
+
+
+def test_products_in_price_range():
+    products = sql.products_in_price_range(20, 60, limit=10)
+    prices = [product.price for product in products]
+    assert 0 < len(prices) <= 10
+    assert prices == sorted(prices)
+    assert all(20 <= price <= 60 for price in prices)
@@ -1,16 +1,52 @@
+import os
+import queue
+import threading
 import time
 import random
-from multiprocessing import Process
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
-from sqlalchemy.orm import declarative_base, sessionmaker
+import sys
+import itertools
+import multiprocessing
+from collections import deque
+from datetime import datetime, timezone
+from sqlalchemy import insert, update, bindparam, select, extract, literal, or_, Column, Index, Integer, String, DateTime
+from sqlalchemy.orm import declarative_base
 from sqlalchemy import func
 
+# The engine factory shared with question3 lives in rakort/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from rakort.database import Database  # noqa: E402
+
 # Database connection
-DATABASE_URL = "sqlite:///process_states.db"
-engine = create_engine(DATABASE_URL, echo=False)
-Session = sessionmaker(bind=engine)
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///process_states.db")
+
+# Worker pool defaults for run_processes; the simulated tasks mostly sleep,
+# so the pool is sized like ThreadPoolExecutor's default rather than per core
+WORKER_COUNT = int(os.environ.get("WORKER_COUNT", str(min(32, (os.cpu_count() or 1) + 4))))
+WORKER_MODE = os.environ.get("WORKER_MODE", "process")  # "process" or "thread"
+TASK_TIMEOUT = float(os.environ.get("TASK_TIMEOUT", "10"))
+TASK_RETRIES = int(os.environ.get("TASK_RETRIES", "2"))
+
+# The state writer commits after this many changes or this many seconds
+STATE_BATCH_SIZE = int(os.environ.get("STATE_BATCH_SIZE", "500"))
+STATE_FLUSH_INTERVAL = float(os.environ.get("STATE_FLUSH_INTERVAL", "0.5"))
+
+
+def configure_engine(url=DATABASE_URL, **options):
+    """Point the module at a new database and return its engine.
+
+    options are passed to create_database_engine.
+    """
+    return database.configure(url, **options)
+
+
 Base = declarative_base()
 
+# Engine, sessions and schema, all created lazily so importing the module does no I/O
+database = Database(DATABASE_URL, Base.metadata)
+Session = database.Session
+get_engine = database.get_engine
+init_schema = database.init_schema
+
 # Define the ProcessState model
 
 
@@ -23,9 +59,10 @@ class ProcessState(Base):
     start_time = Column(DateTime, server_default=func.now())
     end_time = Column(DateTime)
 
-
-# Create tables in the database
-Base.metadata.create_all(engine)
+    __table_args__ = (
+        # Serves per-task lookups and the completed-task anti-join
+        Index('ix_process_states_process_id_status', 'process_id', 'status'),
+    )
 
 
 def process_task(process_id):
@@ -33,57 +70,379 @@ def process_task(process_id):
     start_time = time.time()
     time.sleep(random.uniform(0.1, 2.0))  # Simulate work by sleeping
 
-    # Update the database with the process status
-    session = Session()
-    session.add(ProcessState(process_id=process_id,
-                status='Completed', end_time=func.now()))
-    session.commit()
-    session.close()
-
     print(
         f"Process {process_id} completed in {time.time() - start_time:.2f} seconds.")
 
 
-def run_processes(num_processes=1000):
-    """Start the specified number of processes."""
-    processes = []
+def _utc(timestamp):
+    """Convert a time.time() value to a naive UTC datetime, like func.now() in SQLite."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+class StateWriter:
+    """Single writer thread that owns every write to process_states.
+
+    Workers and the pool only put state changes on a queue. The writer
+    inserts one 'Queued' row per task up front, then applies 'Running' and
+    final states as batched UPDATEs, committing after STATE_BATCH_SIZE
+    changes or STATE_FLUSH_INTERVAL seconds, whichever comes first.
+    Task ids must be non-negative integers: the row of each task is found
+    from its id without a lookup. If a write fails the thread stops, and
+    close() raises the error.
+    """
+
+    def __init__(self, batch_size=STATE_BATCH_SIZE, flush_interval=STATE_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.changes = queue.Queue()
+        self.thread = None
+        self.base_id = None
+        self.error = None
+
+    def start(self, task_ids):
+        """Start the writer thread and queue a row for every task."""
+        with init_schema().connect() as connection:
+            # Rows of this run follow every existing row
+            self.base_id = connection.execute(
+                select(func.max(ProcessState.id))).scalar() or 0
+        self.thread = threading.Thread(target=self._run, args=(task_ids,), daemon=True)
+        self.thread.start()
+
+    def put(self, process_id, status, timestamp=None):
+        """Queue a state change; never touches the database."""
+        self.changes.put((process_id, status, timestamp or time.time()))
+
+    def close(self):
+        """Write all pending changes and stop the writer thread.
+
+        Raises RuntimeError if the writer thread failed, since every change
+        queued after the failure was lost.
+        """
+        self.changes.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise RuntimeError("The state writer failed; later state changes were not saved") \
+                from self.error
+
+    def _run(self, task_ids):
+        try:
+            self._write(task_ids)
+        except Exception as e:
+            self.error = e
+            print(f"State writer stopped: {e!r}")
+
+    def _write(self, task_ids):
+        table = ProcessState.__table__
+        queued = insert(table).values(id=bindparam('row_id'), status='Queued', start_time=None)
+        running = update(table).where(table.c.id == bindparam('row_id')).values(
+            status=bindparam('new_status'), start_time=bindparam('time'))
+        finished = update(table).where(table.c.id == bindparam('row_id')).values(
+            status=bindparam('new_status'), end_time=bindparam('time'))
+
+        with get_engine().connect() as connection:
+            with connection.begin():
+                batch = []
+                for process_id in task_ids:
+                    batch.append({"row_id": self.base_id + 1 + process_id,
+                                  "process_id": process_id})
+                    if len(batch) >= self.batch_size:
+                        connection.execute(queued, batch)
+                        batch = []
+                if batch:
+                    connection.execute(queued, batch)
+
+            pending = []
+            deadline = None
+            while True:
+                timeout = None if not pending else max(0.0, deadline - time.monotonic())
+                try:
+                    change = self.changes.get(timeout=timeout)
+                except queue.Empty:
+                    change = False  # The flush interval has passed
+                if change:
+                    if not pending:
+                        deadline = time.monotonic() + self.flush_interval
+                    pending.append(change)
+                    if len(pending) < self.batch_size:
+                        continue
+                if pending:
+                    self._flush(connection, pending, running, finished)
+                    pending = []
+                if change is None:
+                    break
+
+    def _flush(self, connection, pending, running, finished):
+        """Apply a batch of changes in one transaction, keeping their order."""
+        with connection.begin():
+            for is_running, group in itertools.groupby(
+                    pending, key=lambda change: change[1] == 'Running'):
+                connection.execute(running if is_running else finished, [
+                    {"row_id": self.base_id + 1 + process_id, "new_status": status,
+                     "time": _utc(timestamp)}
+                    for process_id, status, timestamp in group])
+
+
+def _worker_loop(worker_id, tasks, events, forked):
+    """Run tasks from the worker's queue until it receives None."""
+    if forked and database.engine is not None:
+        # Connections inherited through fork must not be shared with the parent
+        database.engine.dispose(close=False)
+    while True:
+        task_id = tasks.get()
+        if task_id is None:
+            break
+        events.put((worker_id, task_id, 'Running', time.time(), None))
+        try:
+            process_task(task_id)
+            events.put((worker_id, task_id, 'Completed', time.time(), None))
+        except Exception as e:
+            events.put((worker_id, task_id, 'Failed', time.time(), repr(e)))
+
+
+class WorkerPool:
+    """Runs tasks on a fixed number of worker processes or threads.
+
+    Each worker has its own task queue, so the pool always knows which task a
+    worker holds. A task that raises, outlives the timeout or loses its
+    worker to a crash is retried up to the retry limit and otherwise recorded
+    as 'Failed', 'Timed out' or 'Crashed'. Hung or dead workers are replaced.
+    Threads cannot be killed, so in thread mode a timed-out thread is
+    abandoned and its late result ignored. Every state change goes through
+    a single StateWriter.
+    """
 
-    for i in range(num_processes):
-        p = Process(target=process_task, args=(i,))
-        p.start()
-        processes.append(p)
+    def __init__(self, size=WORKER_COUNT, mode=WORKER_MODE, timeout=TASK_TIMEOUT,
+                 retries=TASK_RETRIES):
+        if mode not in ('process', 'thread'):
+            raise ValueError(f"Unknown worker mode: {mode}")
+        self.size = size
+        self.mode = mode
+        self.timeout = timeout
+        self.retries = retries
+        self.events = multiprocessing.Queue() if mode == 'process' else queue.Queue()
+        self.workers = {}  # worker id -> [handle, task queue, task id, started at]
+        self.worker_ids = itertools.count()
+        self.attempts = {}
+        self.writer = None
+        self.counts = {"completed": 0, "retried": 0, "failed": 0,
+                       "timed_out": 0, "crashed": 0}
 
-    for p in processes:
-        p.join()  # Wait for all processes to finish
+    def _start_worker(self):
+        worker_id = next(self.worker_ids)
+        if self.mode == 'process':
+            tasks = multiprocessing.Queue()
+            handle = multiprocessing.Process(
+                target=_worker_loop, args=(worker_id, tasks, self.events, True), daemon=True)
+        else:
+            tasks = queue.Queue()
+            handle = threading.Thread(
+                target=_worker_loop, args=(worker_id, tasks, self.events, False), daemon=True)
+        handle.start()
+        self.workers[worker_id] = [handle, tasks, None, None]
 
-    print("All processes have completed.")
+    def _retry_or_record(self, task_id, outcome, status, retry_queue):
+        """Requeue a task that went wrong, or record its final state."""
+        if self.attempts[task_id] <= self.retries:
+            self.counts["retried"] += 1
+            retry_queue.append(task_id)
+        else:
+            self.counts[outcome] += 1
+            del self.attempts[task_id]
+            self.writer.put(task_id, status)
+
+    def _replace_worker(self, worker_id):
+        handle, tasks = self.workers.pop(worker_id)[:2]
+        if self.mode == 'process':
+            handle.terminate()
+            handle.join()
+            tasks.close()
+        else:
+            tasks.put(None)  # Let the abandoned thread exit once it returns
+        self._start_worker()
+
+    def _handle_event(self, event, retry_queue):
+        """Apply one event sent by a worker."""
+        worker_id, task_id, status, timestamp, error = event
+        worker = self.workers.get(worker_id)
+        # Ignore events from workers that were already replaced
+        if worker is None or worker[2] != task_id:
+            return
+        if status == 'Running':
+            self.writer.put(task_id, status, timestamp)
+            return
+        worker[2] = worker[3] = None
+        if status == 'Completed':
+            self.counts["completed"] += 1
+            del self.attempts[task_id]
+            self.writer.put(task_id, status, timestamp)
+        else:
+            print(f"Process {task_id} failed: {error}")
+            self._retry_or_record(task_id, "failed", 'Failed', retry_queue)
+
+    def _drain_events(self, retry_queue):
+        """Apply every event that has already arrived, without waiting."""
+        while True:
+            try:
+                self._handle_event(self.events.get_nowait(), retry_queue)
+            except queue.Empty:
+                return
+
+    def run(self, task_ids):
+        """Run every task and return the outcome counts.
+
+        task_ids is iterated twice, once to queue the tasks and once to run
+        them, so pass a range or a list rather than a generator.
+        """
+        self.writer = StateWriter()
+        self.writer.start(task_ids)  # Also initializes the schema before forking
+        pending = iter(task_ids)
+        retry_queue = deque()
+        for _ in range(self.size):
+            self._start_worker()
+
+        while True:
+            # Hand the next task to every idle worker
+            for worker_id, worker in self.workers.items():
+                if worker[2] is not None:
+                    continue
+                task_id = retry_queue.popleft() if retry_queue else next(pending, None)
+                if task_id is None:
+                    break
+                self.attempts[task_id] = self.attempts.get(task_id, 0) + 1
+                worker[1].put(task_id)
+                worker[2], worker[3] = task_id, time.monotonic()
+
+            busy = [worker for worker in self.workers.values() if worker[2] is not None]
+            if not busy:
+                break
+
+            try:
+                self._handle_event(self.events.get(timeout=0.1), retry_queue)
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            for worker_id in list(self.workers):
+                # Read the current entry, since draining events can finish a task
+                handle, _, task_id, started = self.workers[worker_id]
+                if task_id is None:
+                    continue
+                if not handle.is_alive():
+                    # Apply what the worker sent before it died, such as its 'Running' event
+                    self._drain_events(retry_queue)
+                    crashed = self.workers[worker_id][2] == task_id
+                    self._replace_worker(worker_id)
+                    if crashed:
+                        print(f"Worker running process {task_id} crashed.")
+                        self._retry_or_record(task_id, "crashed", 'Crashed', retry_queue)
+                elif now - started > self.timeout:
+                    print(f"Process {task_id} timed out after {self.timeout} seconds.")
+                    self._replace_worker(worker_id)
+                    self._retry_or_record(task_id, "timed_out", 'Timed out', retry_queue)
+
+        for handle, tasks, _, _ in self.workers.values():
+            tasks.put(None)
+        for handle, _, _, _ in self.workers.values():
+            handle.join()
+        self.workers.clear()
+        self.writer.close()
+        return self.counts
+
+
+def run_processes(num_processes=1000, workers=WORKER_COUNT, mode=WORKER_MODE,
+                  timeout=TASK_TIMEOUT, retries=TASK_RETRIES):
+    """Run the specified number of tasks on a fixed-size worker pool."""
+    counts = WorkerPool(workers, mode, timeout, retries).run(range(num_processes))
+    print(f"All processes have completed: {counts}")
+    return counts
+
+
+def iter_process_states(status=None, batch_size=1000):
+    """Yield (process_id, status, start_time, end_time) rows one at a time.
+
+    Rows are streamed in batches of batch_size (a server-side cursor where
+    the driver has one), so memory use does not grow with the table.
+    """
+    table = ProcessState.__table__
+    query = select(table.c.process_id, table.c.status,
+                   table.c.start_time, table.c.end_time).order_by(table.c.id)
+    if status is not None:
+        query = query.where(table.c.status == status)
+    with init_schema().connect() as connection:
+        yield from connection.execution_options(yield_per=batch_size).execute(query)
+
+
+def _duration_seconds(table):
+    """SQL expression for the run time of a task in seconds."""
+    if get_engine().dialect.name == 'sqlite':
+        return (func.julianday(table.c.end_time) - func.julianday(table.c.start_time)) * 86400.0
+    return extract('epoch', table.c.end_time - table.c.start_time)
+
+
+def process_state_summary(percentiles=(50, 90, 99)):
+    """Return task counts per status and completed-task duration statistics.
+
+    Everything is computed in SQL: a GROUP BY for the counts and a single
+    cume_dist() window pass for the percentiles.
+    """
+    table = ProcessState.__table__
+    with init_schema().connect() as connection:
+        counts = dict(connection.execute(
+            select(table.c.status, func.count()).group_by(table.c.status)).all())
+
+        duration = _duration_seconds(table).label('duration')
+        ranked = select(duration, func.cume_dist().over(order_by=duration).label('rank')).where(
+            table.c.status == 'Completed', table.c.start_time.is_not(None),
+            table.c.end_time.is_not(None)).subquery()
+        columns = [func.count(), func.avg(ranked.c.duration), func.max(ranked.c.duration)]
+        columns += [func.min(ranked.c.duration).filter(ranked.c.rank >= percentile / 100)
+                    for percentile in percentiles]
+        row = connection.execute(select(*columns)).one()
+
+    durations = {"count": row[0], "mean": row[1], "max": row[2]}
+    durations.update({f"p{percentile}": value
+                      for percentile, value in zip(percentiles, row[3:])})
+    return {"counts": counts, "durations": durations}
+
+
+def iter_remaining_processes(num_processes, batch_size=1000):
+    """Yield (process_id, latest status) for every task whose latest row is not 'Completed'.
+
+    The task ids 0..num_processes-1 come from a recursive CTE, so tasks that
+    never wrote a row are reported too, with a status of None. Process ids
+    repeat across runs, so only the latest row of each task counts.
+    """
+    if num_processes <= 0:
+        return
+    table = ProcessState.__table__
+    task_ids = select(literal(0).label('process_id')).cte('task_ids', recursive=True)
+    task_ids = task_ids.union_all(
+        select(task_ids.c.process_id + 1).where(task_ids.c.process_id < num_processes - 1))
+    latest_status = (select(table.c.status).where(table.c.process_id == task_ids.c.process_id)
+                     .order_by(table.c.id.desc()).limit(1).scalar_subquery())
+    latest = select(task_ids.c.process_id, latest_status.label('status')).subquery()
+    query = select(latest.c.process_id, latest.c.status).where(
+        or_(latest.c.status.is_(None), latest.c.status != 'Completed'))
+    with init_schema().connect() as connection:
+        yield from connection.execution_options(yield_per=batch_size).execute(query)
 
 
 def fetch_process_states():
     """Fetch and print all process states from the database."""
-    session = Session()
-    states = session.query(ProcessState).all()
-
-    # Print all process states
-    for state in states:
+    for process_id, status, start_time, end_time in iter_process_states():
         print(
-            f'Process ID: {state.process_id}, Status: {state.status}, Start Time: {state.start_time}, End Time: {state.end_time}')
-
-    session.close()
+            f'Process ID: {process_id}, Status: {status}, Start Time: {start_time}, End Time: {end_time}')
 
 
 def fetch_remaining_processes(num_processes):
     """Fetch and print remaining processes that are not completed."""
-    session = Session()
-    remaining_processes = session.query(ProcessState).filter(
-        ProcessState.status != 'Completed').all()
-
     print("\nRemaining Processes:")
-    for process in remaining_processes:
-        print(
-            f'Process ID: {process.process_id}, Status: {process.status}, Start Time: {process.start_time}, End Time: {process.end_time}')
+    for process_id, status in iter_remaining_processes(num_processes):
+        print(f'Process ID: {process_id}, Status: {status or "Never started"}')
 
-    session.close()
+    summary = process_state_summary()
+    print(f"Status counts: {summary['counts']}")
+    print(f"Completed task durations (seconds): {summary['durations']}")
 
 
 if __name__ == "__main__":
@@ -1,56 +1,401 @@
+import asyncio
+import os
 import paramiko
+import resource
+import sys
 import threading
 import ipaddress
+import select
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# The TCP connect helpers shared with the scanning apps live in rakort/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from rakort.tcp import is_dead_host_error, open_connection  # noqa: E402
+
+# Bytes read from a channel at a time
+CHUNK_SIZE = 32768
+
+
+def _default_probe_concurrency():
+    """Return a sweep concurrency that leaves half the open-file limit for everything else."""
+    soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    if soft_limit == resource.RLIM_INFINITY:
+        return 1024
+    return max(1, min(1024, soft_limit // 2))
+
+
+# Default number of addresses probed at once by iter_live_hosts
+PROBE_CONCURRENCY = _default_probe_concurrency()
+
+
+class _Capture:
+    """Keeps the first `limit` bytes of a stream and counts the rest."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.size = 0
+        self.chunks = []
+        self.kept = 0
+
+    def add(self, data):
+        self.size += len(data)
+        if self.limit is None or self.kept < self.limit:
+            keep = data if self.limit is None else data[:self.limit - self.kept]
+            self.chunks.append(keep)
+            self.kept += len(keep)
+
+    def text(self):
+        return b''.join(self.chunks).decode('utf-8', errors='replace')
+
+    @property
+    def truncated(self):
+        return self.size > self.kept
 
 
 class SSHManager:
-    def __init__(self, network_block, username, password):
-        """Initialize the SSHManager with a network block and credentials."""
+    def __init__(self, network_block, username, password, max_workers=64,
+                 max_connections=1024, idle_timeout=300, keepalive=30, connect_timeout=10,
+                 command_timeout=None):
+        """Initialize the SSHManager with a network block and credentials.
+
+        Commands run on a pool of at most max_workers threads. Connections are
+        cached per host and reused by later commands; at most max_connections
+        stay open, the least recently used one is closed first, and any
+        connection idle for idle_timeout seconds is closed by evict_idle().
+        Cached connections send a keepalive every keepalive seconds. A command
+        still running after command_timeout seconds is abandoned. Connections
+        in use by a command are never evicted, so the cache can briefly hold
+        more than max_connections when max_workers is larger.
+        """
         self.network_block = ipaddress.ip_network(network_block)
         self.username = username
         self.password = password
+        self.max_workers = max_workers
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.command_timeout = command_timeout
+        self._connections = OrderedDict()  # ip -> (client, last used)
+        self._in_use = Counter()  # ip -> commands currently using its connection
+        self._lock = threading.Lock()
 
-    def execute_command(self, ip, command):
-        """Establish an SSH connection to the given IP and execute a command."""
-        try:
-            # Create SSH client
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    def _connect(self, ip):
+        """Open a new SSH connection to the given IP."""
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(str(ip), username=self.username, password=self.password,
+                       timeout=self.connect_timeout)
+        client.get_transport().set_keepalive(self.keepalive)
+        print(f"Connected to {ip}")
+        return client
+
+    def get_client(self, ip):
+        """Return a live cached connection to the given IP, connecting if needed."""
+        key = str(ip)
+        with self._lock:
+            entry = self._connections.pop(key, None)
+        if entry is not None:
+            client = entry[0]
+            transport = client.get_transport()
+            if transport is not None and transport.is_active():
+                self._store(key, client)
+                return client
+            client.close()
+
+        client = self._connect(ip)
+        self._store(key, client)
+        return client
+
+    def _store(self, key, client):
+        """Cache a connection as most recently used, closing the oldest if full."""
+        with self._lock:
+            self._connections[key] = (client, time.monotonic())
+            self._connections.move_to_end(key)
+            evicted = self._trim()
+        for old_client in evicted:
+            old_client.close()
 
-            # Connect to the server
-            client.connect(str(ip), username=self.username,
-                           password=self.password)
-            print(f"Connected to {ip}")
+    def _trim(self):
+        """Remove the least recently used idle connections above max_connections.
 
-            # Execute the command
-            stdin, stdout, stderr = client.exec_command(command)
-            output = stdout.read().decode('utf-8')
-            error = stderr.read().decode('utf-8')
+        Must be called with the lock held; returns the clients to close.
+        """
+        excess = len(self._connections) - self.max_connections
+        if excess <= 0:
+            return []
+        idle = [key for key in self._connections if not self._in_use[key]][:excess]
+        return [self._connections.pop(key)[0] for key in idle]
 
-            # Close the connection
+    def _check_out(self, ip):
+        """Mark the host's connection as in use so it cannot be evicted."""
+        with self._lock:
+            self._in_use[str(ip)] += 1
+
+    def _check_in(self, ip):
+        """Release a connection marked with _check_out, evicting if the cache is over full."""
+        key = str(ip)
+        with self._lock:
+            self._in_use[key] -= 1
+            if not self._in_use[key]:
+                del self._in_use[key]
+            evicted = self._trim()
+        for old_client in evicted:
+            old_client.close()
+
+    def _discard(self, ip):
+        """Drop and close the cached connection to the given IP, if any."""
+        with self._lock:
+            entry = self._connections.pop(str(ip), None)
+        if entry is not None:
+            entry[0].close()
+
+    def evict_idle(self):
+        """Close cached connections that have not been used for idle_timeout seconds."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [key for key, (_, last_used) in self._connections.items()
+                    if last_used < cutoff and not self._in_use[key]]
+            clients = [self._connections.pop(key)[0] for key in idle]
+        for client in clients:
             client.close()
+        return len(clients)
+
+    def close(self):
+        """Close every cached connection."""
+        with self._lock:
+            clients = [client for client, _ in self._connections.values()]
+            self._connections.clear()
+        for client in clients:
+            client.close()
+
+    def __enter__(self):
+        return self
 
-            # Print output and error
-            print(f"Output from {ip}:\n{output}")
-            if error:
-                print(f"Error from {ip}:\n{error}")
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
+    def _run_one(self, client, ip, command, max_output, on_chunk):
+        """Run a command on an open connection and return its result record."""
+        started = time.monotonic()
+        deadline = None if self.command_timeout is None else started + self.command_timeout
+        channel = client.get_transport().open_session()
+        channel.exec_command(command)
+        stdout, stderr = _Capture(max_output), _Capture(max_output)
+        timed_out = False
+
+        # Read both streams as data arrives, so neither buffer can fill up
+        while True:
+            if channel.recv_ready():
+                data = channel.recv(CHUNK_SIZE)
+                stdout.add(data)
+                if on_chunk:
+                    on_chunk(ip, 'stdout', data)
+            elif channel.recv_stderr_ready():
+                data = channel.recv_stderr(CHUNK_SIZE)
+                stderr.add(data)
+                if on_chunk:
+                    on_chunk(ip, 'stderr', data)
+            elif channel.exit_status_ready():
+                # Output sent before the exit status may have arrived since the
+                # checks above; read it before finishing
+                if channel.recv_ready() or channel.recv_stderr_ready():
+                    continue
+                break
+            elif deadline is not None and time.monotonic() >= deadline:
+                timed_out = True
+                break
+            else:
+                # Stderr does not wake select, so wait with a short timeout
+                select.select([channel], [], [], 0.1)
+        exit_status = None if timed_out else channel.recv_exit_status()
+        channel.close()
+
+        return {"command": command, "exit_status": exit_status,
+                "duration": time.monotonic() - started,
+                "stdout": stdout.text(), "stderr": stderr.text(),
+                "stdout_bytes": stdout.size, "stderr_bytes": stderr.size,
+                "truncated": stdout.truncated or stderr.truncated,
+                "timed_out": timed_out}
+
+    def execute_command(self, ip, command, max_output=None, on_chunk=None):
+        """Run one command, or a list of commands, over the host's cached SSH connection.
+
+        Returns a per-host record with the connection error, if any, the total
+        duration and one result per command holding its exit status, duration,
+        output sizes and output. Only the first max_output bytes of each
+        stream are kept; on_chunk(ip, stream, data) receives all of it as it
+        arrives.
+        """
+        commands = [command] if isinstance(command, str) else list(command)
+        started = time.monotonic()
+        record = {"ip": str(ip), "error": None, "duration": None, "results": []}
+        self._check_out(ip)
+        try:
+            client = self.get_client(ip)
+            for cmd in commands:
+                try:
+                    result = self._run_one(client, ip, cmd, max_output, on_chunk)
+                except paramiko.SSHException:
+                    # The cached session went away; reconnect once and retry
+                    self._discard(ip)
+                    client = self.get_client(ip)
+                    result = self._run_one(client, ip, cmd, max_output, on_chunk)
+                record["results"].append(result)
         except Exception as e:
-            print(f"Failed to connect to {ip}: {str(e)}")
+            self._discard(ip)
+            record["error"] = str(e)
+        finally:
+            self._check_in(ip)
+        record["duration"] = time.monotonic() - started
+        return record
+
+    def iter_results(self, command, max_output=None, on_chunk=None):
+        """Run a command on all hosts in the network block, yielding each host's record as it finishes.
+
+        At most max_workers hosts are worked on at once and only about twice
+        that many are queued, so large network blocks do not create a thread
+        or a future per host up front, and finished records are not held.
+        """
+        self.evict_idle()
+        hosts = self.network_block.hosts()  # Iterate through all hosts in the network block
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = set()
+            for ip in hosts:
+                if len(in_flight) >= self.max_workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                in_flight.add(executor.submit(
+                    self.execute_command, ip, command, max_output, on_chunk))
+
+            # Wait for all commands to complete
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    def run_commands(self, command, callback=None, max_output=None):
+        """Run a command on all hosts in the network block with a bounded thread pool.
+
+        Each host's record goes to callback as soon as the host finishes; by
+        default it is printed. Returns counts of hosts by outcome.
+        """
+        callback = callback or print_record
+        summary = {"hosts": 0, "failed": 0, "succeeded": 0, "output_bytes": 0}
+        for record in self.iter_results(command, max_output):
+            _tally(summary, record)
+            callback(record)
+        print(f"All commands executed: {summary}")
+        return summary
+
+    async def _probe(self, ip, port, timeout):
+        """Return the IP if something accepts a TCP connection on the port, else None.
+
+        Only timeouts, refusals and unreachable errors count as a dead host.
+        Running out of file descriptors is retried with a backoff and raised
+        if it persists; any other error is raised as well.
+        """
+        try:
+            _, writer = await open_connection(str(ip), port, timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            if is_dead_host_error(e):
+                return None
+            raise
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return ip
+
+    async def iter_live_hosts(self, port=22, timeout=1.0, concurrency=PROBE_CONCURRENCY):
+        """Sweep the network block for hosts accepting connections on port, yielding each as it answers.
+
+        Every address gets at most timeout seconds and concurrency addresses
+        are probed at once, so a sweep takes about
+        num_addresses / concurrency * timeout seconds in the worst case.
+        """
+        pending = set()
+        for ip in self.network_block.hosts():
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.result() is not None:
+                        yield task.result()
+            pending.add(asyncio.ensure_future(self._probe(ip, port, timeout)))
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.result() is not None:
+                    yield task.result()
+
+    async def run_commands_async(self, command, callback=None, max_output=None, port=22,
+                                 probe_timeout=1.0, probe_concurrency=PROBE_CONCURRENCY):
+        """Sweep the network block for open SSH ports and run a command only on the hosts that answered.
+
+        SSH sessions start as soon as each host answers the sweep and run on
+        the same bounded thread pool as run_commands, so dead addresses cost
+        one probe_timeout instead of a thread blocked for connect_timeout.
+        """
+        loop = asyncio.get_running_loop()
+        callback = callback or print_record
+        summary = {"hosts": 0, "failed": 0, "succeeded": 0, "output_bytes": 0}
+
+        def finish(done):
+            for future in done:
+                record = future.result()
+                _tally(summary, record)
+                callback(record)
+
+        self.evict_idle()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            sessions = set()
+            async for ip in self.iter_live_hosts(port, probe_timeout, probe_concurrency):
+                if len(sessions) >= self.max_workers * 2:
+                    done, sessions = await asyncio.wait(
+                        sessions, return_when=asyncio.FIRST_COMPLETED)
+                    finish(done)
+                sessions.add(loop.run_in_executor(
+                    executor, self.execute_command, ip, command, max_output))
+
+            # Wait for all commands to complete
+            while sessions:
+                done, sessions = await asyncio.wait(sessions, return_when=asyncio.FIRST_COMPLETED)
+                finish(done)
+        print(f"All commands executed: {summary}")
+        return summary
+
+
+def _tally(summary, record):
+    """Add a host record to the run_commands outcome counts."""
+    summary["hosts"] += 1
+    ok = record["error"] is None and all(
+        result["exit_status"] == 0 for result in record["results"])
+    summary["succeeded" if ok else "failed"] += 1
+    summary["output_bytes"] += sum(result["stdout_bytes"] + result["stderr_bytes"]
+                                   for result in record["results"])
 
-    def run_commands(self, command):
-        """Run a command on all hosts in the network block simultaneously."""
-        threads = []
-        for ip in self.network_block.hosts():  # Iterate through all hosts in the network block
-            thread = threading.Thread(
-                target=self.execute_command, args=(ip, command))
-            threads.append(thread)
-            thread.start()  # Start the thread
 
-        # Wait for all threads to complete
-        for thread in threads:
-            thread.join()
-        print("All commands executed.")
+def print_record(record):
+    """Print a host record the way run_commands always has."""
+    ip = record["ip"]
+    if record["error"] is not None:
+        print(f"Failed to connect to {ip}: {record['error']}")
+        return
+    for result in record["results"]:
+        # Print output and error
+        print(f"Output from {ip}:\n{result['stdout']}")
+        if result["stderr"]:
+            print(f"Error from {ip}:\n{result['stderr']}")
+        if result["timed_out"]:
+            print(f"Command on {ip} timed out: {result['command']}")
+        if result["truncated"]:
+            print(f"Output from {ip} truncated ({result['stdout_bytes']} bytes stdout, "
+                  f"{result['stderr_bytes']} bytes stderr).")
 
 
 if __name__ == "__main__":
@@ -60,5 +405,9 @@ if __name__ == "__main__":
     password = "your_password"  # Replace with your SSH password
     command = "uptime"  # Replace with the command you want to execute
 
-    ssh_manager = SSHManager(network_block, username, password)
-    ssh_manager.run_commands(command)
+    with SSHManager(network_block, username, password) as ssh_manager:
+        ssh_manager.run_commands(command)
+        # Later runs reuse the open connections instead of a new handshake
+        ssh_manager.run_commands(["uptime", "df -h"])
+        # Sparse subnets: only open SSH sessions to hosts answering on port 22
+        asyncio.run(ssh_manager.run_commands_async(command, probe_timeout=0.5))
@@ -1,10 +1,178 @@
 import paramiko
+import select
 import time
 import re
 
+from sinks import JSONLinesSink
+
+# Bytes read from the SSH channel at a time
+CHUNK_SIZE = 65536
+
+# Longest wait for channel data, so a silent dead session is noticed
+MAX_IDLE_WAIT = 5.0
+
+# Longest wait between sink ticks, so buffered records are written out on a quiet capture
+SINK_TICK_INTERVAL = 1.0
+
+# Longest wait for the exit status once the output has ended (in seconds)
+EXIT_STATUS_WAIT = 2.0
+
+# A session that stays up this long (in seconds) resets the reconnect backoff
+STABLE_SESSION_TIME = 60.0
+
+# Matches a dhcpdump header line such as "  TIME: ..." or " CHADDR: ..."
+FIELD_PATTERN = re.compile(r'\s*([A-Z]+):\s*(.*?)\s*$')
+
+# Matches the "<code> (<length>) " header that follows each "OPTION:" marker
+OPTION_HEADER = re.compile(r'\s*(\d+)\s*\(\s*\d+\)\s*')
+
+# Descriptions dhcpdump prints in front of the values of well-known options
+OPTION_NAMES = {
+    12: "Host name",
+    50: "Request IP address",
+    53: "DHCP message type",
+    60: "Vendor class identifier",
+    61: "Client-identifier",
+}
+
+MESSAGE_TYPES = {
+    1: "DHCPDISCOVER", 2: "DHCPOFFER", 3: "DHCPREQUEST", 4: "DHCPDECLINE",
+    5: "DHCPACK", 6: "DHCPNAK", 7: "DHCPRELEASE", 8: "DHCPINFORM",
+}
+
+# Option fields saved with every packet, in order
+REQUEST_FIELDS = ("Client-identifier", "Request IP address",
+                  "Vendor class identifier", "Host name")
+REQUEST_OPTIONS = {name: code for code, name in OPTION_NAMES.items()}
+
+
+def parse_options(line):
+    """
+    Extract every DHCP option in a line in a single pass.
+
+    :param line: A line of dhcpdump-style output.
+    :return: A dict mapping option codes to their values. The description of
+        well-known options is stripped; other options keep their full text.
+    """
+    if 'OPTION:' not in line:
+        return {}
+    options = {}
+    # Each option's text runs up to the next marker or the end of the line
+    for piece in line.split('OPTION:')[1:]:
+        header = OPTION_HEADER.match(piece)
+        if header is None:
+            continue
+        code = int(header.group(1))
+        text = piece[header.end():].rstrip()
+        name = OPTION_NAMES.get(code)
+        if name is not None and text.startswith(name):
+            text = text[len(name):].lstrip()
+        options[code] = text
+    return options
+
+
+def message_type(options):
+    """Return the DHCP message type number from parsed options, or None."""
+    value = options.get(53)
+    if not value:
+        return None
+    number = value.split(None, 1)[0]
+    return int(number) if number.isdigit() else None
+
+
+def packet_record(packet):
+    """
+    Turn an assembled packet into the record DHCPParser saves.
+
+    :param packet: A packet from DHCPPacketAssembler.
+    :return: A dict with the time, message type, client hardware address,
+        offered or assigned address and the well-known option fields, plus
+        every option and header field; None if the packet has no message type.
+    """
+    options, fields = packet["options"], packet["fields"]
+    code = message_type(options)
+    if code is None:
+        return None
+    chaddr = fields.get("CHADDR")
+    data = {
+        "Time": fields.get("TIME"),
+        "Message type": MESSAGE_TYPES.get(code, str(code)),
+        # dhcpdump pads the hardware address to 16 octets
+        "Client hardware address": ':'.join(chaddr.split(':')[:6]) if chaddr else None,
+        "Your IP address": fields.get("YIADDR"),
+    }
+    for name in REQUEST_FIELDS:
+        data[name] = options.get(REQUEST_OPTIONS[name])
+    data["options"] = options
+    data["fields"] = fields
+    return data
+
+
+class DHCPPacketAssembler:
+    """Group lines of dhcpdump output into one packet at a time."""
+
+    def __init__(self):
+        self.packet = None
+        self.last_option = None
+
+    def _current(self):
+        """Return the packet being assembled, starting one if needed."""
+        if self.packet is None:
+            self.packet = {"fields": {}, "options": {}}
+        return self.packet
+
+    def feed(self, line):
+        """
+        Add a line to the packet being assembled.
+
+        A packet ends at a dashed separator line, at the TIME line of the next
+        packet, or at a second message type option; the last case also splits
+        output that has a whole packet on each line.
+
+        :param line: A line of dhcpdump output.
+        :return: The packet this line completed, or None.
+        """
+        stripped = line.strip()
+        if not stripped:
+            return None
+        if stripped.startswith('---'):
+            return self.flush()
+
+        done = None
+        if 'OPTION:' in line:
+            options = parse_options(line)
+            if 53 in options and self.packet is not None and 53 in self.packet["options"]:
+                done = self.flush()
+            self._current()["options"].update(options)
+            if options:
+                self.last_option = next(reversed(options))
+            return done
+
+        field = FIELD_PATTERN.match(line)
+        if field is None:
+            # Long options such as the parameter request list wrap onto
+            # indented continuation lines
+            if self.packet is not None and self.last_option is not None:
+                self.packet["options"][self.last_option] += ' ' + stripped
+            return None
+        self.last_option = None
+        key, value = field.groups()
+        if key == "TIME" and self.packet is not None:
+            done = self.flush()
+        self._current()["fields"][key] = value
+        return done
+
+    def flush(self):
+        """Return the packet being assembled, if any, and start over."""
+        packet, self.packet = self.packet, None
+        self.last_option = None
+        return packet
+
 
 class DHCPParser:
-    def __init__(self, host, username, password, command, duration=300):
+    def __init__(self, host, username, password, command, duration=300, verbose=True,
+                 connect_timeout=10, keepalive=30, reconnect_delay=1, max_reconnect_delay=60,
+                 sinks=(), keep_results=True, track_clients=False, restart_on_exit=False):
         """
         Initialize the DHCPParser with server connection details and command.
 
@@ -12,72 +180,211 @@ class DHCPParser:
         :param username: The username for SSH connection.
         :param password: The password for SSH connection.
         :param command: The command to be executed on the server.
-        :param duration: The duration for which to run the command (in seconds).
+        :param duration: The duration for which to run the command (in seconds),
+            or None to run until interrupted.
+        :param verbose: Whether to print every parsed record.
+        :param connect_timeout: The SSH connection timeout (in seconds).
+        :param keepalive: The interval between SSH keepalives (in seconds).
+        :param reconnect_delay: The first wait before reconnecting after the
+            session drops (in seconds); it doubles up to max_reconnect_delay
+            and starts over after a session that stayed up.
+        :param max_reconnect_delay: The longest wait before reconnecting.
+        :param sinks: Sinks from sinks.py that each record is written to as
+            soon as it is parsed.
+        :param keep_results: Whether to keep every record in self.results.
+            Turn it off for long captures so memory stays constant.
+        :param track_clients: Whether to keep the latest state of each client,
+            keyed by hardware address, in self.clients.
+        :param restart_on_exit: Whether to run the command again when it exits
+            on its own before the duration ends. By default the capture stops.
         """
         self.host = host
         self.username = username
         self.password = password
         self.command = command
         self.duration = duration
+        self.verbose = verbose
+        self.connect_timeout = connect_timeout
+        self.keepalive = keepalive
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.ssh = None
+        self.sinks = list(sinks)
+        self.keep_results = keep_results
+        self.track_clients = track_clients
+        self.restart_on_exit = restart_on_exit
         self.results = []
+        self.clients = {}
+        self.assembler = DHCPPacketAssembler()
 
     def connect_ssh(self):
-        """Establish an SSH connection to the server."""
+        """Establish an SSH connection to the server and return whether it succeeded."""
         try:
             self.ssh = paramiko.SSHClient()
             self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             self.ssh.connect(self.host, username=self.username,
-                             password=self.password)
+                             password=self.password, timeout=self.connect_timeout)
+            self.ssh.get_transport().set_keepalive(self.keepalive)
             print("SSH connection established.")
+            return True
         except Exception as e:
             print(f"An error occurred while establishing SSH connection: {e}")
+            return False
+
+    def read_lines(self, channel, deadline):
+        """
+        Yield lines of the command's output as they arrive.
+
+        Output is read in large chunks without blocking and split into lines
+        incrementally. Between chunks the reader sleeps in select until data
+        arrives, the channel closes or the deadline passes, and ticks the
+        sinks each time it wakes up.
+
+        :param channel: The channel running the command.
+        :param deadline: The time.monotonic() value to stop at, or None.
+        :return: A generator that ends at the deadline or when the channel closes.
+        """
+        pending = b''
+        while True:
+            if channel.recv_ready():
+                data = channel.recv(CHUNK_SIZE)
+                if not data:
+                    break
+                *lines, pending = (pending + data).split(b'\n')
+                for line in lines:
+                    yield line.decode('utf-8', errors='replace') + '\n'
+            elif channel.recv_stderr_ready():
+                # Drain stderr so it cannot fill the channel window
+                channel.recv_stderr(CHUNK_SIZE)
+            elif channel.closed or channel.eof_received:
+                # Data sent before EOF may have arrived since the checks above
+                if channel.recv_ready() or channel.recv_stderr_ready():
+                    continue
+                break
+
+            wait = min(MAX_IDLE_WAIT, SINK_TICK_INTERVAL) if self.sinks else MAX_IDLE_WAIT
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                wait = min(wait, remaining)
+            if not channel.recv_ready() and not channel.recv_stderr_ready():
+                select.select([channel], [], [], wait)
+                self.tick()
+
+        if pending:
+            yield pending.decode('utf-8', errors='replace') + '\n'
+
+    def wait_for_exit(self, channel, timeout=EXIT_STATUS_WAIT):
+        """
+        Return whether the command exited on its own after its output ended.
+
+        The exit status can arrive shortly after EOF, so it is waited for up
+        to timeout seconds; a session that dropped never sends it.
+
+        :param channel: The channel running the command.
+        :param timeout: The longest wait for the exit status (in seconds).
+        """
+        if not (channel.closed or channel.eof_received):
+            return False  # Reading stopped at the deadline
+        give_up = time.monotonic() + timeout
+        while not channel.exit_status_ready():
+            if time.monotonic() >= give_up:
+                return False
+            time.sleep(0.05)
+        return True
 
     def run_command(self):
-        """Run the specified command and collect data for a given duration."""
-        self.connect_ssh()
-        stdin, stdout, stderr = self.ssh.exec_command(self.command)
+        """Run the specified command and collect data for a given duration, reconnecting if the session drops."""
+        deadline = None if self.duration is None else time.monotonic() + self.duration
+        delay = self.reconnect_delay
 
-        # Start time to keep track of duration
-        start_time = time.time()
+        while deadline is None or time.monotonic() < deadline:
+            exited = False
+            started = time.monotonic()
+            if self.connect_ssh():
+                try:
+                    channel = self.ssh.get_transport().open_session()
+                    channel.exec_command(self.command)
+                    for line in self.read_lines(channel, deadline):
+                        self.parse_line(line)
+                    exited = self.wait_for_exit(channel)
+                except Exception as e:
+                    print(f"An error occurred while reading command output: {e}")
+                finally:
+                    self.ssh.close()
 
-        while time.time() - start_time < self.duration:
-            line = stdout.readline()
-            if line:
-                self.parse_line(line)
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if exited:
+                # The command ended on its own, so its last packet is complete
+                self.finish()
+                if not self.restart_on_exit:
+                    print(f"Command on {self.host} exited.")
+                    break
+            else:
+                # The session dropped mid-packet; discard the partial packet
+                self.assembler.flush()
+                # Write out the complete records before waiting to reconnect
+                for sink in self.sinks:
+                    sink.flush()
+            if time.monotonic() - started >= STABLE_SESSION_TIME:
+                delay = self.reconnect_delay
+            if deadline is not None:
+                delay = min(delay, max(deadline - time.monotonic(), 0))
+            print(f"Session to {self.host} ended, reconnecting in {delay:.1f}s.")
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
 
-        self.ssh.close()
+        self.finish()
 
     def parse_line(self, line):
-        """Parse each line for DHCP messages."""
-        # Regular expression to match the required DHCP fields
-        dhcp_request_pattern = re.compile(
-            r'OPTION: 53 \( 1\) DHCP message type 3 \(DHCPREQUEST\)')
-        client_id_pattern = re.compile(
-            r'OPTION: 61 \( 7\) Client-identifier (.+)')
-        request_ip_pattern = re.compile(
-            r'OPTION: 50 \( 4\) Request IP address (.+)')
-        vendor_class_pattern = re.compile(
-            r'OPTION: 60 \( 15\) Vendor class identifier (.+)')
-        host_name_pattern = re.compile(r'OPTION: 12 \( 12\) Host name (.+)')
-
-        # Check if the line contains a DHCP request
-        if dhcp_request_pattern.search(line):
-            client_id = client_id_pattern.search(line)
-            request_ip = request_ip_pattern.search(line)
-            vendor_class = vendor_class_pattern.search(line)
-            host_name = host_name_pattern.search(line)
-
-            # Store parsed data in a dictionary
-            data = {
-                "Client-identifier": client_id.group(1) if client_id else None,
-                "Request IP address": request_ip.group(1) if request_ip else None,
-                "Vendor class identifier": vendor_class.group(1) if vendor_class else None,
-                "Host name": host_name.group(1) if host_name else None
-            }
+        """Parse each line for DHCP messages, handling every packet the line completes."""
+        packet = self.assembler.feed(line)
+        if packet is not None:
+            self.handle_packet(packet)
+
+    def tick(self):
+        """Let the sinks flush or rotate on time while no packets arrive."""
+        for sink in self.sinks:
+            sink.tick()
+
+    def finish(self):
+        """Handle the last packet once the output has ended and flush the sinks."""
+        packet = self.assembler.flush()
+        if packet is not None:
+            self.handle_packet(packet)
+        for sink in self.sinks:
+            sink.flush()
 
+    def handle_packet(self, packet):
+        """Store the record of a complete packet."""
+        data = packet_record(packet)
+        if data is None:
+            return
+        for sink in self.sinks:
+            sink.write(data)
+        if self.keep_results:
             self.results.append(data)
+        if self.track_clients:
+            self.update_client(data)
+        if self.verbose:
             print(f"Parsed data: {data}")
 
+    def update_client(self, data):
+        """Merge a record into the latest known state of its client."""
+        key = data["Client hardware address"] or data["Client-identifier"]
+        if key is None:
+            return
+        state = self.clients.get(key)
+        if state is None:
+            state = self.clients[key] = {"First seen": data["Time"], "Packets": 0}
+        state["Packets"] += 1
+        state["Last seen"] = data["Time"]
+        # Fields a packet leaves out keep their earlier value
+        state.update((name, value) for name, value in data.items()
+                     if value is not None and name not in ("options", "fields"))
+
     def save_results(self, filename):
         """Save parsed results to a text file."""
         with open(filename, 'w') as file:
@@ -97,3 +404,10 @@ if __name__ == "__main__":
     parser = DHCPParser(HOST, USERNAME, PASSWORD, COMMAND, DURATION)
     parser.run_command()
     parser.save_results('parsed_dhcp_requests.txt')
+
+    # Long captures: stream records to rotating files and keep only the
+    # latest state of each client in memory
+    with JSONLinesSink('dhcp_records.jsonl', max_bytes=100 * 1024 * 1024) as records:
+        parser = DHCPParser(HOST, USERNAME, PASSWORD, COMMAND, None, verbose=False,
+                            sinks=[records], keep_results=False, track_clients=True)
+        parser.run_command()
@@ -0,0 +1,153 @@
+import argparse
+import gzip
+import os
+import random
+import tempfile
+import time
+
+from DHCP import DHCPParser, MESSAGE_TYPES
+from replay import iter_lines, replay, replay_parallel
+
+# A DHCPREQUEST with every option on one line, and lines the parser skips
+SAMPLE_LINES = [
+    "OPTION: 53 ( 1) DHCP message type 3 (DHCPREQUEST) "
+    "OPTION: 61 ( 7) Client-identifier 01:00:11:22:33:44:55 "
+    "OPTION: 50 ( 4) Request IP address 192.168.1.20 "
+    "OPTION: 60 ( 15) Vendor class identifier MSFT 5.0 "
+    "OPTION: 12 ( 12) Host name workstation1 "
+    "OPTION: 55 ( 4) Parameter Request List 1 3 6 15\n",
+    "OPTION: 53 ( 1) DHCP message type 5 (DHCPACK) "
+    "OPTION: 54 ( 4) Server identifier 192.168.1.1\n",
+    "  TIME: 2024-01-01 00:00:00.000\n",
+    "    IP: 192.168.1.1 (0:11:22:33:44:55) > 255.255.255.255 (ff:ff:ff:ff:ff:ff)\n",
+]
+
+SEPARATOR = '-' * 75
+
+
+def generate_packet(rng, when, clients):
+    """
+    Return the dhcpdump output of one random packet as a string.
+
+    :param rng: The random.Random to draw from.
+    :param when: The packet's Unix timestamp.
+    :param clients: The number of distinct clients to draw from.
+    """
+    client = rng.randrange(clients)
+    mac = ':'.join(f'{byte:02x}' for byte in client.to_bytes(6, 'big'))
+    address = f'10.{client >> 16 & 255}.{client >> 8 & 255}.{client & 255}'
+    code = rng.choice((1, 2, 3, 5))
+    server = code in (2, 5)
+    stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(when)) + f'.{int(when * 1000) % 1000:03d}'
+    lines = [
+        f'  TIME: {stamp}',
+        f'    IP: {"10.0.0.1" if server else "0.0.0.0"} ({mac}) > 255.255.255.255 (ff:ff:ff:ff:ff:ff)',
+        f'    OP: {2 if server else 1} ({"BOOTPREPLY" if server else "BOOTPREQUEST"})',
+        ' HTYPE: 1 (Ethernet)',
+        'CIADDR: 0.0.0.0',
+        f'YIADDR: {address if server else "0.0.0.0"}',
+        f'CHADDR: {mac}:00:00:00:00:00:00:00:00:00:00',
+        f'OPTION:  53 (  1) DHCP message type         {code} ({MESSAGE_TYPES[code]})',
+    ]
+    if server:
+        lines.append('OPTION:  54 (  4) Server identifier         10.0.0.1')
+        lines.append('OPTION:  51 (  4) IP address leasetime      86400 (24h)')
+    else:
+        lines.append(f'OPTION:  61 (  7) Client-identifier         01:{mac}')
+        if code == 3:
+            lines.append(f'OPTION:  50 (  4) Request IP address        {address}')
+        lines.append('OPTION:  60 (  8) Vendor class identifier   MSFT 5.0')
+        lines.append(f'OPTION:  12 ( 10) Host name                 host{client}')
+        lines.append('OPTION:  55 (  4) Parameter Request List      1 (Subnet mask)')
+        lines.append('\t\t\t\t\t    3 (Routers)')
+    lines.append(SEPARATOR)
+    return '\n'.join(lines) + '\n'
+
+
+def generate_log(path, num_packets, clients=1000, seed=0):
+    """
+    Write a synthetic dhcpdump log; paths ending in .gz are gzip-compressed.
+
+    :param path: The file to write.
+    :param num_packets: The number of packets to write.
+    :param clients: The number of distinct clients to draw from.
+    :param seed: The random seed, so runs are reproducible.
+    """
+    rng = random.Random(seed)
+    opener = gzip.open if path.endswith('.gz') else open
+    when = 1704067200.0
+    with opener(path, 'wt', encoding='utf-8') as file:
+        for _ in range(num_packets):
+            when += rng.random() / 10
+            file.write(generate_packet(rng, when, clients))
+
+
+def benchmark_parse_line(num_lines, repeat=3):
+    """
+    Time DHCPParser.parse_line over sample lines.
+
+    :param num_lines: The number of lines to parse per run.
+    :param repeat: The number of runs; the fastest one is reported.
+    :return: The best rate in lines per second.
+    """
+    lines = [SAMPLE_LINES[i % len(SAMPLE_LINES)] for i in range(num_lines)]
+    best = 0.0
+    for _ in range(repeat):
+        parser = DHCPParser(None, None, None, None, verbose=False)
+        start_time = time.perf_counter()
+        for line in lines:
+            parser.parse_line(line)
+        elapsed = time.perf_counter() - start_time
+        best = max(best, num_lines / elapsed)
+    return best
+
+
+def benchmark_replay(path, mode, processes=None):
+    """
+    Time replaying a log file in one mode.
+
+    :param path: The log file.
+    :param mode: 'file', 'mmap' or 'parallel'.
+    :param processes: The number of processes for the 'parallel' mode.
+    :return: A dict with the seconds taken, lines and records parsed and
+        their rates per second.
+    """
+    # Count lines before timing so the count does not cost a second pass
+    lines = sum(1 for _ in iter_lines(path))
+    start_time = time.perf_counter()
+    if mode == 'parallel':
+        records = len(replay_parallel(path, processes)[1])
+    else:
+        records = len(replay(path, use_mmap=mode == 'mmap').results)
+    elapsed = time.perf_counter() - start_time
+    return {"seconds": elapsed, "lines": lines, "records": records,
+            "lines_per_sec": lines / elapsed, "records_per_sec": records / elapsed}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark DHCP log parsing.")
+    arg_parser.add_argument('--lines', type=int, default=200000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--packets', type=int, default=100000,
+                            help="Packets in the synthetic log to replay (0 skips replay).")
+    arg_parser.add_argument('--processes', type=int, default=os.cpu_count())
+    arg_parser.add_argument('--gzip', action='store_true', help="Also replay a gzip copy.")
+    args = arg_parser.parse_args()
+
+    rate = benchmark_parse_line(args.lines, args.repeat)
+    print(f"parse_line: {rate:,.0f} lines/sec")
+
+    if args.packets:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, 'dhcp.log')]
+            if args.gzip:
+                paths.append(os.path.join(directory, 'dhcp.log.gz'))
+            for path in paths:
+                generate_log(path, args.packets)
+                modes = ['file'] if path.endswith('.gz') else ['file', 'mmap', 'parallel']
+                for mode in modes:
+                    result = benchmark_replay(path, mode, args.processes)
+                    print(f"{os.path.basename(path)} {mode}: "
+                          f"{result['lines_per_sec']:,.0f} lines/sec, "
+                          f"{result['records_per_sec']:,.0f} records/sec "
+                          f"({result['records']} records in {result['seconds']:.2f}s)")
@@ -0,0 +1,167 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+from datetime import datetime
+
+from DHCP import DHCPParser, packet_record
+
+# Format of the TIME field dhcpdump prints for each packet
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def _packet_time(value):
+    """Return a packet's TIME field as a Unix timestamp, or None."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, TIME_FORMAT).timestamp()
+    except ValueError:
+        return None
+
+
+class _ServerParser(DHCPParser):
+    """A DHCPParser that hands its records to a DHCPCollector."""
+
+    def __init__(self, collector, host, *args, **kwargs):
+        super().__init__(host, *args, verbose=False, keep_results=False, **kwargs)
+        self.collector = collector
+        self.counters = collector.counters[host]
+
+    def parse_line(self, line):
+        self.counters["lines"] += 1
+        super().parse_line(line)
+
+    def handle_packet(self, packet):
+        data = packet_record(packet)
+        if data is None:
+            return
+        data["Server"] = self.host
+        self.counters["records"] += 1
+        received = time.time()
+        sent = _packet_time(data["Time"])
+        if sent is not None:
+            self.counters["lag"] = received - sent
+        # Order by packet time; a packet without a readable time goes by arrival
+        self.collector.records.put((received if sent is None else sent, received, data))
+
+
+class DHCPCollector:
+    def __init__(self, hosts, username, password, command, duration=300, sinks=(),
+                 reorder_window=1.0, stats_interval=60, verbose=True, keep_results=True,
+                 **parser_options):
+        """
+        Capture DHCP traffic from many servers at once into one time-ordered stream.
+
+        Each server is read by its own DHCPParser on its own thread. Records
+        are held for reorder_window seconds and released in packet time
+        order, so packets from different servers come out interleaved by time.
+
+        :param hosts: The servers' IP addresses.
+        :param username: The username for SSH connections.
+        :param password: The password for SSH connections.
+        :param command: The command to be executed on every server.
+        :param duration: The duration for which to capture (in seconds), or
+            None to run until interrupted.
+        :param sinks: Sinks from sinks.py that each merged record is written to.
+        :param reorder_window: How long records wait for earlier packets from
+            slower servers (in seconds).
+        :param stats_interval: How often to print per-server counters (in
+            seconds), or None.
+        :param verbose: Whether to print every merged record.
+        :param keep_results: Whether to keep every merged record in self.results.
+        :param parser_options: Extra DHCPParser options, such as
+            connect_timeout or reconnect_delay.
+        """
+        self.hosts = list(hosts)
+        self.username = username
+        self.password = password
+        self.command = command
+        self.duration = duration
+        self.sinks = list(sinks)
+        self.reorder_window = reorder_window
+        self.stats_interval = stats_interval
+        self.verbose = verbose
+        self.keep_results = keep_results
+        self.parser_options = parser_options
+        self.records = queue.Queue()
+        self.counters = {host: {"lines": 0, "records": 0, "lag": None} for host in self.hosts}
+        self.results = []
+        self._pending = []
+        self._order = itertools.count()
+
+    def stats(self, elapsed):
+        """
+        Summarize each server's counters.
+
+        :param elapsed: The capture time so far (in seconds).
+        :return: A dict mapping each server to its line and record counts,
+            lines/sec, records/sec and lag (in seconds) behind its latest packet.
+        """
+        return {host: {"lines": counters["lines"], "records": counters["records"],
+                       "lines_per_sec": counters["lines"] / elapsed if elapsed else 0.0,
+                       "records_per_sec": counters["records"] / elapsed if elapsed else 0.0,
+                       "lag": counters["lag"]}
+                for host, counters in self.counters.items()}
+
+    def emit(self, data):
+        """Write a merged record to the sinks and keep it if asked."""
+        for sink in self.sinks:
+            sink.write(data)
+        if self.keep_results:
+            self.results.append(data)
+        if self.verbose:
+            print(f"Parsed data: {data}")
+
+    def _release(self, cutoff):
+        """Emit held records that arrived before cutoff, in packet time order."""
+        while self._pending and self._pending[0][2] <= cutoff:
+            self.emit(heapq.heappop(self._pending)[3])
+
+    def run(self):
+        """Capture from every server until the duration ends and return per-server counters."""
+        threads = []
+        for host in self.hosts:
+            parser = _ServerParser(self, host, self.username, self.password, self.command,
+                                   self.duration, **self.parser_options)
+            thread = threading.Thread(target=parser.run_command, name=f"dhcp-{host}",
+                                      daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        start_time = time.monotonic()
+        next_stats = start_time + self.stats_interval if self.stats_interval else None
+        while any(thread.is_alive() for thread in threads) or not self.records.empty():
+            try:
+                packet_time, received, data = self.records.get(timeout=0.1)
+                heapq.heappush(self._pending, (packet_time, next(self._order), received, data))
+            except queue.Empty:
+                pass
+            # A held record is released once no slower server can still
+            # send an earlier packet within the reorder window
+            self._release(time.time() - self.reorder_window)
+            for sink in self.sinks:
+                sink.tick()
+            if next_stats is not None and time.monotonic() >= next_stats:
+                print(f"Collector stats: {self.stats(time.monotonic() - start_time)}")
+                next_stats += self.stats_interval
+
+        self._release(float('inf'))
+        for sink in self.sinks:
+            sink.flush()
+        stats = self.stats(time.monotonic() - start_time)
+        print(f"Collector stats: {stats}")
+        return stats
+
+
+if __name__ == "__main__":
+    # Define parameters
+    HOSTS = ['dhcp1_ip', 'dhcp2_ip']  # Enter the DHCP servers' IP addresses
+    USERNAME = 'your_username'  # Enter your username
+    PASSWORD = 'your_password'  # Enter your password
+    COMMAND = 'your_command'  # Enter the SSH command you want to monitor
+    DURATION = 300  # Listening duration (in seconds)
+
+    collector = DHCPCollector(HOSTS, USERNAME, PASSWORD, COMMAND, DURATION)
+    collector.run()
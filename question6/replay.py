@@ -0,0 +1,154 @@
+import argparse
+import gzip
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from DHCP import DHCPParser
+
+
+def _is_gzip(path):
+    """Return whether a file starts with the gzip magic number."""
+    with open(path, 'rb') as file:
+        return file.read(2) == b'\x1f\x8b'
+
+
+def iter_lines(path, use_mmap=False, start=0, end=None):
+    """
+    Yield the lines of a captured log file.
+
+    :param path: A plain or gzip-compressed log file.
+    :param use_mmap: Whether to memory-map a plain file instead of reading it
+        through a buffered file object.
+    :param start: The byte offset to start at in a plain file.
+    :param end: The byte offset to stop at in a plain file, or None.
+    :return: A generator of decoded lines.
+    """
+    if _is_gzip(path):
+        with gzip.open(path, 'rt', encoding='utf-8', errors='replace') as file:
+            yield from file
+        return
+
+    with open(path, 'rb') as file:
+        if use_mmap:
+            if os.path.getsize(path) == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                mapped.seek(start)
+                stop = len(mapped) if end is None else end
+                while mapped.tell() < stop:
+                    yield mapped.readline().decode('utf-8', errors='replace')
+            return
+
+        file.seek(start)
+        position = start
+        for line in file:
+            if end is not None and position >= end:
+                break
+            position += len(line)
+            yield line.decode('utf-8', errors='replace')
+
+
+def replay(path, parser=None, use_mmap=False):
+    """
+    Feed a captured log file through the same parsing pipeline as a live capture.
+
+    :param path: A plain or gzip-compressed log file.
+    :param parser: The DHCPParser to feed, or None for a quiet new one.
+    :param use_mmap: Whether to memory-map a plain file.
+    :return: The parser, holding the records in its results, clients and sinks.
+    """
+    if parser is None:
+        parser = DHCPParser(None, None, None, None, verbose=False)
+    for line in iter_lines(path, use_mmap):
+        parser.parse_line(line)
+    parser.finish()
+    return parser
+
+
+def _packet_boundary(mapped, offset):
+    """Return the first packet start at or after offset in a memory-mapped log."""
+    if offset == 0:
+        return 0
+    separator = mapped.find(b'\n---', offset - 1)
+    if separator == -1:
+        # Without dashed separators every line is a packet
+        line_end = mapped.find(b'\n', offset - 1)
+    else:
+        line_end = mapped.find(b'\n', separator + 1)
+    return len(mapped) if line_end == -1 else line_end + 1
+
+
+def split_offsets(path, parts):
+    """
+    Split a plain log file into byte ranges that start on packet boundaries.
+
+    :param path: A plain log file.
+    :param parts: The number of ranges to aim for.
+    :return: A list of (start, end) byte offsets covering the file.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            bounds = sorted({_packet_boundary(mapped, size * part // parts)
+                             for part in range(parts)} | {size})
+    return list(zip(bounds, bounds[1:]))
+
+
+def _parse_range(path, start, end, use_mmap):
+    """Parse one byte range of a log file and return its line count and records."""
+    parser = DHCPParser(None, None, None, None, verbose=False)
+    lines = 0
+    for line in iter_lines(path, use_mmap, start, end):
+        lines += 1
+        parser.parse_line(line)
+    parser.finish()
+    return lines, parser.results
+
+
+def replay_parallel(path, processes=None, use_mmap=True):
+    """
+    Parse a large log file on a process pool, one packet-aligned range per task.
+
+    Gzip files cannot be split, so they are parsed in one task.
+
+    :param path: A plain or gzip-compressed log file.
+    :param processes: The number of worker processes; defaults to the CPU count.
+    :param use_mmap: Whether workers memory-map their range.
+    :return: The number of lines read and the records, in file order.
+    """
+    processes = processes or os.cpu_count() or 1
+    if _is_gzip(path):
+        ranges = [(0, None)]
+    else:
+        ranges = split_offsets(path, processes * 4)
+
+    lines, records = 0, []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_parse_range, path, start, end, use_mmap)
+                   for start, end in ranges]
+        for future in futures:
+            range_lines, range_records = future.result()
+            lines += range_lines
+            records.extend(range_records)
+    return lines, records
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Parse captured DHCP logs offline.")
+    arg_parser.add_argument('paths', nargs='+', help="Plain or gzip-compressed log files.")
+    arg_parser.add_argument('--processes', type=int, default=0,
+                            help="Parse each file on this many processes (0 parses in-process).")
+    arg_parser.add_argument('--mmap', action='store_true', help="Memory-map plain files.")
+    arg_parser.add_argument('--output', default='parsed_dhcp_requests.txt')
+    args = arg_parser.parse_args()
+
+    parser = DHCPParser(None, None, None, None, verbose=False)
+    for path in args.paths:
+        if args.processes:
+            parser.results.extend(replay_parallel(path, args.processes, args.mmap)[1])
+        else:
+            replay(path, parser, args.mmap)
+    parser.save_results(args.output)
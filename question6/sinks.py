@@ -0,0 +1,195 @@
+import csv
+import json
+import os
+import sqlite3
+import time
+
+# Record fields written as columns by the CSV and SQLite sinks, in order
+RECORD_COLUMNS = ("Time", "Message type", "Client hardware address", "Your IP address",
+                  "Client-identifier", "Request IP address", "Vendor class identifier",
+                  "Host name")
+
+
+def _options_json(record):
+    """Return a record's options as a compact JSON object."""
+    return json.dumps(record.get("options", {}), separators=(',', ':'))
+
+
+class RotatingFileSink:
+    """
+    Base class for sinks that append records to a file and rotate it.
+
+    Flushing and age-based rotation are checked on every write and on every
+    tick(), which the producer calls while no records arrive.
+    """
+
+    def __init__(self, path, max_bytes=None, max_age=None, flush_interval=1.0):
+        """
+        Open the sink's file for appending.
+
+        :param path: The file to write; rotated files get a timestamp suffix.
+        :param max_bytes: Rotate once the file reaches this size, or None.
+        :param max_age: Rotate once the file is this old (in seconds), or None.
+        :param flush_interval: The longest time written records stay buffered
+            (in seconds), provided tick() is called at least this often.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.file = None
+        self._open()
+
+    def _open(self):
+        """Open the file, starting it with a header if it is new."""
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, 'a', newline='', encoding='utf-8')
+        self.opened_at = time.monotonic()
+        self.last_flush = self.opened_at
+        if new:
+            self.write_header()
+
+    def write_header(self):
+        """Write whatever starts a new file; nothing by default."""
+
+    def write_record(self, record):
+        """Write one record to the file."""
+        raise NotImplementedError
+
+    def write(self, record):
+        """Write a record, flushing and rotating the file when due."""
+        self.write_record(record)
+        self.tick()
+        if self.max_bytes is not None and self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def tick(self):
+        """Flush and rotate the file if their time has come."""
+        now = time.monotonic()
+        if now - self.last_flush >= self.flush_interval:
+            self.flush()
+        if self.max_age is not None and now - self.opened_at >= self.max_age:
+            self.rotate()
+
+    def flush(self):
+        """Push buffered records to the operating system."""
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def rotate(self):
+        """Close the file under a timestamped name and start a new one."""
+        self.file.close()
+        root, ext = os.path.splitext(self.path)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        target = f"{root}-{stamp}{ext}"
+        counter = 1
+        while os.path.exists(target):
+            target = f"{root}-{stamp}-{counter}{ext}"
+            counter += 1
+        os.rename(self.path, target)
+        self._open()
+
+    def close(self):
+        """Flush and close the file."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class JSONLinesSink(RotatingFileSink):
+    """Write each record as one JSON object per line."""
+
+    def write_record(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+
+class CSVSink(RotatingFileSink):
+    """Write each record as a CSV row of RECORD_COLUMNS plus its options as JSON."""
+
+    def _open(self):
+        super()._open()
+        self.writer = csv.writer(self.file)
+
+    def write_header(self):
+        csv.writer(self.file).writerow(RECORD_COLUMNS + ("options",))
+
+    def write_record(self, record):
+        self.writer.writerow([record.get(column) for column in RECORD_COLUMNS]
+                             + [_options_json(record)])
+
+
+class SQLiteSink:
+    """
+    Insert records into a SQLite table in batched transactions.
+
+    A batch is committed when it fills up, or once it is flush_interval old
+    on a later write or tick(), which the producer calls while no records
+    arrive.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=1.0):
+        """
+        Open the database and create the records table if needed.
+
+        :param path: The SQLite database file.
+        :param batch_size: Commit once this many records are waiting.
+        :param flush_interval: The longest time records wait for a commit
+            (in seconds), provided tick() is called at least this often.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS dhcp_records ('
+            'time TEXT, message_type TEXT, client_mac TEXT, your_ip TEXT, '
+            'client_id TEXT, request_ip TEXT, vendor_class TEXT, host_name TEXT, '
+            'options TEXT)')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS ix_dhcp_records_client_mac '
+            'ON dhcp_records (client_mac)')
+        self.pending = []
+        self.last_flush = time.monotonic()
+
+    def write(self, record):
+        """Queue a record, committing the batch when it is full or old enough."""
+        self.pending.append(tuple(record.get(column) for column in RECORD_COLUMNS)
+                            + (_options_json(record),))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        else:
+            self.tick()
+
+    def tick(self):
+        """Commit the queued records if they have waited flush_interval seconds."""
+        if self.pending and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Insert and commit the queued records."""
+        if self.pending:
+            with self.connection:
+                self.connection.executemany(
+                    'INSERT INTO dhcp_records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    self.pending)
+            self.pending = []
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        """Commit the queued records and close the database."""
+        if self.connection is not None:
+            self.flush()
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,97 @@
+import threading
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+
+
+def create_database_engine(url, pool_size=5, max_overflow=10, pool_pre_ping=False,
+                           wal=True, busy_timeout=30, echo=False):
+    """Create an engine for any SQLAlchemy URL with explicit pool settings.
+
+    In-memory SQLite shares one connection so every session sees the same
+    database. File-backed SQLite gets WAL journaling and a busy timeout (in
+    seconds) on every connection, so concurrent writers wait for the lock
+    instead of failing with "database is locked".
+    """
+    url = make_url(url)
+    options = {"echo": echo, "pool_pre_ping": pool_pre_ping}
+    is_sqlite = url.get_backend_name() == 'sqlite'
+
+    if is_sqlite and url.database in (None, '', ':memory:'):
+        options.update(poolclass=StaticPool,
+                       connect_args={"check_same_thread": False})
+    else:
+        options.update(poolclass=QueuePool, pool_size=pool_size,
+                       max_overflow=max_overflow)
+    new_engine = create_engine(url, **options)
+
+    if is_sqlite:
+        @event.listens_for(new_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+            if wal and url.database not in (None, '', ':memory:'):
+                cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.close()
+
+    return new_engine
+
+
+def create_indexes(bind, metadata):
+    """Create every index declared in metadata that does not exist yet."""
+    with bind.begin() as connection:
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+class Database:
+    """Lazily created engine, session factory and schema for one set of tables.
+
+    Nothing touches the database until get_engine() or init_schema() is
+    called, so importing a module that owns a Database does no I/O.
+    """
+
+    def __init__(self, url, metadata):
+        self.url = url
+        self.metadata = metadata
+        self.engine = None
+        self.Session = sessionmaker()
+        # Engine whose schema has been created by init_schema()
+        self._schema_engine = None
+        self._schema_lock = threading.Lock()
+
+    def configure(self, url=None, **options):
+        """Point at a new database and return its engine.
+
+        options are passed to create_database_engine; url defaults to the
+        one given at construction.
+        """
+        if self.engine is not None:
+            self.engine.dispose()
+        self.engine = create_database_engine(url or self.url, **options)
+        self.Session.configure(bind=self.engine)
+        return self.engine
+
+    def get_engine(self):
+        """Return the engine, creating it from the default URL on first use."""
+        if self.engine is None:
+            self.configure()
+        return self.engine
+
+    def init_schema(self):
+        """Create the tables on first use and return the engine.
+
+        The result is cached per engine, so repeated calls cost nothing and the
+        database is not touched until something actually needs it.
+        """
+        current = self.get_engine()
+        if self._schema_engine is not current:
+            with self._schema_lock:
+                if self._schema_engine is not current:
+                    self.metadata.create_all(current)
+                    # create_all skips indexes on tables that already exist
+                    create_indexes(current, self.metadata)
+                    self._schema_engine = current
+        return current
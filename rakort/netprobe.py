@@ -0,0 +1,338 @@
+from fastapi import Request
+import asyncio
+import bisect
+import functools
+import heapq
+import itertools
+import json
+import os
+import socket
+import struct
+import time
+import httpx
+
+from rakort.tcp import is_dead_host_error, open_connection
+
+# Ports tried by the TCP probe; a refused connection still proves the host is up
+probe_ports = [int(port) for port in
+               os.environ.get("PROBE_PORTS", "22,80,443").split(",")]
+
+# Time limit for a single reachability probe
+probe_timeout = float(os.environ.get("PROBE_TIMEOUT", "2.0"))
+
+# Maximum number of undelivered events kept for each streaming client
+stream_queue_size = int(os.environ.get("STREAM_QUEUE_SIZE", "1000"))
+
+
+class ResultStore:
+    """Keeps the latest probe result for each host.
+
+    Hosts are keyed by the integer form of their IPv4 address and stored once,
+    however often they are probed. Every state keeps a sorted index of keys,
+    so a page is served with a bisect and a slice instead of a full scan.
+    """
+
+    def __init__(self):
+        # Packed IP -> [reachable, last_checked, last_seen, failures]
+        self._records = {}
+        self._index = {True: [], False: []}
+
+    @staticmethod
+    def pack(ip: str):
+        """Converts a dotted IPv4 address to its integer form."""
+        return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+    @staticmethod
+    def unpack(key: int):
+        """Converts an integer IPv4 address back to dotted form."""
+        return socket.inet_ntoa(struct.pack("!I", key))
+
+    def record(self, ip: str, reachable: bool, timestamp: float = None):
+        """Stores the outcome of a probe.
+
+        Args:
+            ip (str): The probed IP address.
+            reachable (bool): Whether the host answered.
+            timestamp (float): The probe time; defaults to now.
+
+        Returns:
+            bool: The previous state of the host, or None if it is new.
+        """
+        key = self.pack(ip)
+        now = timestamp or time.time()
+        entry = self._records.get(key)
+        previous = None
+        if entry is None:
+            entry = self._records[key] = [reachable, now, None, 0]
+            bisect.insort(self._index[reachable], key)
+        else:
+            previous = entry[0]
+            if previous != reachable:
+                old_index = self._index[previous]
+                del old_index[bisect.bisect_left(old_index, key)]
+                bisect.insort(self._index[reachable], key)
+                entry[0] = reachable
+
+        entry[1] = now
+        if reachable:
+            entry[2] = now
+            entry[3] = 0
+        else:
+            entry[3] += 1  # Consecutive failures since the host was last seen
+        return previous
+
+    def get(self, ip: str):
+        """Returns the stored record for an IP address, or None."""
+        key = self.pack(ip)
+        if key not in self._records:
+            return None
+        return self._as_dict(key)
+
+    def _as_dict(self, key: int):
+        reachable, last_checked, last_seen, failures = self._records[key]
+        return {"ip": self.unpack(key), "reachable": reachable,
+                "last_checked": last_checked, "last_seen": last_seen,
+                "failures": failures}
+
+    def page_keys(self, reachable: bool = None, after: str = None, limit: int = 100):
+        """Returns one page of packed addresses in ascending order.
+
+        Args:
+            reachable (bool): Only return hosts in this state; None returns all.
+            after (str): Return hosts after this IP address (the page cursor).
+            limit (int): The maximum number of hosts to return.
+
+        Returns:
+            tuple: The page of keys and the cursor for the next page, or None.
+
+        Raises:
+            ValueError: If the cursor is not an IPv4 address.
+        """
+        try:
+            start = self.pack(after) + 1 if after else 0
+        except OSError:
+            raise ValueError(f"Invalid cursor {after!r}: expected an IPv4 address") from None
+        states = [reachable] if reachable is not None else [True, False]
+        slices = []
+        for state in states:
+            index = self._index[state]
+            position = bisect.bisect_left(index, start)
+            slices.append(index[position:position + limit + 1])
+
+        keys = list(itertools.islice(heapq.merge(*slices), limit + 1))
+        cursor = self.unpack(keys[limit - 1]) if len(keys) > limit else None
+        return keys[:limit], cursor
+
+    def page(self, reachable: bool = None, after: str = None, limit: int = 100):
+        """Returns one page of full records; see ``page_keys``."""
+        keys, cursor = self.page_keys(reachable, after, limit)
+        return [self._as_dict(key) for key in keys], cursor
+
+    def page_ips(self, reachable: bool = None, after: str = None, limit: int = 100):
+        """Returns one page of IP addresses; see ``page_keys``."""
+        keys, cursor = self.page_keys(reachable, after, limit)
+        return [self.unpack(key) for key in keys], cursor
+
+    def counts(self):
+        """Returns the number of hosts in each state."""
+        return {"reachable": len(self._index[True]),
+                "unreachable": len(self._index[False])}
+
+    def __len__(self):
+        return len(self._records)
+
+
+class Subscriber:
+    """Bounded event queue for one streaming client.
+
+    When the client falls behind, the oldest events are dropped so that
+    publishing never waits on a slow reader.
+    """
+
+    def __init__(self, maxsize: int = None):
+        self.queue = asyncio.Queue(maxsize or stream_queue_size)
+        self.dropped = 0
+
+    def put(self, event: dict):
+        """Queues an event without blocking, discarding the oldest one if full."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def stream(self, request: Request, kind: str):
+        """Yields queued events as Server-Sent Events until the client leaves.
+
+        Args:
+            request (Request): The streaming request, used to detect disconnects.
+            kind (str): The SSE event name.
+
+        Yields:
+            str: One SSE message, or a keep-alive comment when idle.
+        """
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(self.queue.get(), timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if self.dropped:
+                # Tell the client how many events it missed
+                event = {**event, "dropped": self.dropped}
+                self.dropped = 0
+            yield f"event: {kind}\ndata: {json.dumps(event)}\n\n"
+
+
+async def http_probe(ip: str, client: httpx.AsyncClient, timeout: float = probe_timeout):
+    """Checks reachability with an HTTP GET request.
+
+    Args:
+        ip (str): The IP address to probe.
+        client (httpx.AsyncClient): The shared HTTP client used for probing.
+        timeout (float): The request timeout in seconds.
+
+    Returns:
+        tuple: ``(reachable, reason)`` where reason explains a failure.
+    """
+    try:
+        response = await client.get(f"http://{ip}", timeout=timeout)
+    except (httpx.RequestError, httpx.HTTPStatusError) as e:
+        return False, str(e)
+    if response.status_code == 200:
+        return True, None
+    return False, f"HTTP status code: {response.status_code}"
+
+
+async def _tcp_connect(ip: str, port: int, timeout: float):
+    """Returns True if the host answers a TCP connect on the port, even with a refusal.
+
+    Errors that do not mean the host is down, such as running out of file
+    descriptors, are raised instead of reporting a live host as unreachable.
+    """
+    try:
+        _, writer = await open_connection(ip, port, timeout)
+    except ConnectionRefusedError:
+        return True  # The host sent a RST, so it is up
+    except (OSError, asyncio.TimeoutError) as e:
+        if is_dead_host_error(e):
+            return False
+        raise
+    writer.close()
+    return True
+
+
+async def tcp_probe(ip: str, ports: list = None, timeout: float = probe_timeout):
+    """Checks reachability with plain TCP connects on the configured ports.
+
+    All ports are tried at once, so a dead host costs a single timeout.
+
+    Args:
+        ip (str): The IP address to probe.
+        ports (list): The ports to try; defaults to ``probe_ports``.
+        timeout (float): The connect timeout in seconds.
+
+    Returns:
+        tuple: ``(reachable, reason)`` where reason explains a failure.
+    """
+    ports = ports or probe_ports
+    results = await asyncio.gather(
+        *(_tcp_connect(ip, port, timeout) for port in ports))
+    if any(results):
+        return True, None
+    return False, f"no TCP answer on ports {ports}"
+
+
+def _open_icmp_socket():
+    """Opens an ICMP socket, preferring the unprivileged datagram kind."""
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+    except PermissionError:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+
+
+@functools.lru_cache(maxsize=None)
+def icmp_available():
+    """Returns True if this process is allowed to send ICMP echo requests."""
+    try:
+        _open_icmp_socket().close()
+    except OSError:
+        return False
+    return True
+
+
+_icmp_sequence = itertools.count()
+
+
+def _icmp_checksum(data: bytes):
+    """Computes the Internet checksum of an ICMP packet."""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+async def icmp_probe(ip: str, timeout: float = probe_timeout):
+    """Checks reachability with a single ICMP echo request.
+
+    Args:
+        ip (str): The IP address to probe.
+        timeout (float): The time to wait for the echo reply in seconds.
+
+    Returns:
+        tuple: ``(reachable, reason)`` where reason explains a failure.
+    """
+    loop = asyncio.get_running_loop()
+    ident = os.getpid() & 0xFFFF
+    sequence = next(_icmp_sequence) & 0xFFFF
+    payload = b"rakort-probe"
+    header = struct.pack("!BBHHH", 8, 0, 0, ident, sequence)
+    checksum = _icmp_checksum(header + payload)
+    packet = struct.pack("!BBHHH", 8, 0, checksum, ident, sequence) + payload
+
+    sock = _open_icmp_socket()
+    sock.setblocking(False)
+    try:
+        # Connecting filters incoming packets to replies from this host only
+        sock.connect((ip, 0))
+        await loop.sock_sendall(sock, packet)
+        deadline = loop.time() + timeout
+        while True:
+            data = await asyncio.wait_for(
+                loop.sock_recv(sock, 1024), timeout=deadline - loop.time())
+            if sock.type == socket.SOCK_RAW:
+                data = data[(data[0] & 0x0F) * 4:]  # Strip the IP header
+            reply_type, _, _, _, reply_sequence = struct.unpack(
+                "!BBHHH", data[:8])
+            # Datagram ICMP sockets rewrite the identifier, so match on sequence
+            if reply_type == 0 and reply_sequence == sequence:
+                return True, None
+    except (asyncio.TimeoutError, ValueError):
+        return False, "no ICMP echo reply"
+    except OSError as e:
+        return False, str(e)
+    finally:
+        sock.close()
+
+
+def get_probe(backend: str, client: httpx.AsyncClient = None):
+    """Returns the probe coroutine function for the named backend.
+
+    Args:
+        backend (str): One of "http", "tcp" or "icmp".
+        client (httpx.AsyncClient): The shared HTTP client for the "http" backend.
+
+    Returns:
+        callable: An async function taking an IP and returning ``(reachable, reason)``.
+    """
+    if backend == "http":
+        return functools.partial(http_probe, client=client)
+    if backend == "tcp":
+        return tcp_probe
+    if backend == "icmp":
+        if icmp_available():
+            return icmp_probe
+        print("ICMP probing is not permitted for this process, falling back to TCP.")
+        return tcp_probe
+    raise ValueError(f"Unknown probe backend: {backend}")
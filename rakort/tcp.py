@@ -0,0 +1,50 @@
+import asyncio
+import errno
+
+# Connect errors that mean the probed host is down, unreachable or not listening
+DEAD_HOST_ERRNOS = {errno.ECONNREFUSED, errno.ECONNRESET, errno.ETIMEDOUT,
+                    errno.EHOSTUNREACH, errno.EHOSTDOWN, errno.ENETUNREACH, errno.ENETDOWN}
+
+# Connect errors that mean this process ran out of file descriptors
+FD_EXHAUSTED_ERRNOS = {errno.EMFILE, errno.ENFILE}
+
+# Times a connect is retried after running out of file descriptors
+FD_RETRIES = 5
+
+
+async def open_connection(host: str, port: int, timeout: float):
+    """Opens a TCP connection, waiting for free file descriptors if needed.
+
+    Running out of file descriptors says nothing about the host, so the
+    connect is retried with a backoff while other connections close, and the
+    error is raised if it persists.
+
+    Args:
+        host (str): The address to connect to.
+        port (int): The TCP port.
+        timeout (float): The limit for each connect attempt in seconds.
+
+    Returns:
+        tuple: The ``(reader, writer)`` pair of the connection.
+
+    Raises:
+        asyncio.TimeoutError: If the host did not answer in time.
+        OSError: If the connect failed; ``is_dead_host_error`` tells whether
+            the error means the host is down.
+    """
+    for attempt in range(FD_RETRIES + 1):
+        try:
+            return await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except asyncio.TimeoutError:
+            raise
+        except OSError as e:
+            if e.errno not in FD_EXHAUSTED_ERRNOS or attempt == FD_RETRIES:
+                raise
+        # Wait for other connections to release their sockets
+        await asyncio.sleep(0.05 * 2 ** attempt)
+
+
+def is_dead_host_error(error: BaseException):
+    """Returns True if a connect error means the host is down, unreachable or not listening."""
+    return (isinstance(error, asyncio.TimeoutError)
+            or (isinstance(error, OSError) and error.errno in DEAD_HOST_ERRNOS))